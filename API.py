@@ -1,6 +1,6 @@
 """
 ======================================================================
-API --- 
+API ---
 
     Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
     Copyright © 2025, ZiLiang, all rights reserved.
@@ -10,33 +10,459 @@ API ---
 
 
 # ------------------------ Code --------------------------------------
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import openai
+from tqdm import tqdm
+from collections import Counter
+from email.utils import parsedate_to_datetime
+import asyncio
+import httpx
+import json
 import os
+import random
+import threading
+import time
 
 from prompts import *
+from llm_cache import LLMResponseCache
 
 
 API_KEY=os.environ["FOR_JAPAN_API_KEY"]
 # API_KEY=os.environ["DS_JAPAN_API_KEY"]
 
-def one_time_LLM(prompt,user_input):
-    client = OpenAI(
-        api_key=API_KEY, # 
-        base_url="https://api.moonshot.cn/v1",
-        # base_url="https://api.deepseek.com",
-    )
-    completion = client.chat.completions.create(
-        # model = "kimi-k2-turbo-preview",
-        model = "kimi-k2-0905-preview",
-        # model = "deepseek-chat",
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": user_input}
-        ],
-    )
-    resp=completion.choices[0].message.content
+# 可用 FOR_JAPAN_BASE_URL 指向本地 mock_llm_server.py 做离线压测
+BASE_URL=os.environ.get("FOR_JAPAN_BASE_URL", "https://api.moonshot.cn/v1")
+# BASE_URL="https://api.deepseek.com"
+
+MODEL_NAME="kimi-k2-0905-preview"
+# MODEL_NAME="kimi-k2-turbo-preview"
+# MODEL_NAME="deepseek-chat"
+
+
+# 设为 0 可关闭本地响应缓存（例如需要重新采样模型输出时）
+USE_CACHE=os.environ.get("LLM_CACHE", "1")!="0"
+_RESPONSE_CACHE=None
+
+
+def get_cache():
+    global _RESPONSE_CACHE
+    if not USE_CACHE:
+        return None
+    if _RESPONSE_CACHE is None:
+        _RESPONSE_CACHE=LLMResponseCache()
+    return _RESPONSE_CACHE
+
+
+class LLMClientManager:
+    """
+    进程内共享的 OpenAI 客户端。
+
+    所有 LLM 调用复用同一个 httpx 连接池，避免每个句子都重新建立
+    TCP/TLS 连接。客户端在第一次使用时才创建。
+    """
+
+    def __init__(self,
+                 pool_size: int = 16,
+                 keepalive_connections: int = 16,
+                 keepalive_expiry: float = 60.0,
+                 connect_timeout: float = 10.0,
+                 read_timeout: float = 120.0):
+        self.pool_size = pool_size
+        self.keepalive_connections = keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def get(self) -> OpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    http_client = httpx.Client(
+                        limits=self._limits(),
+                        timeout=self._timeout(),
+                    )
+                    self._client = OpenAI(
+                        api_key=API_KEY,
+                        base_url=BASE_URL,
+                        http_client=http_client,
+                        max_retries=0,  # 重试由 RETRY_POLICY 统一负责
+                    )
+        return self._client
+
+    def new_async(self) -> AsyncOpenAI:
+        """
+        异步客户端绑定在事件循环上，所以每次 asyncio.run 都新建一个，
+        用 ``async with`` 在循环结束前关闭。
+        """
+        http_client = httpx.AsyncClient(
+            limits=self._limits(),
+            timeout=self._timeout(),
+        )
+        return AsyncOpenAI(
+            api_key=API_KEY,
+            base_url=BASE_URL,
+            http_client=http_client,
+            max_retries=0,
+        )
+
+    def configure(self, **kwargs):
+        """修改连接池参数；已存在的客户端会被关闭，下次调用时按新参数重建。"""
+        for k, v in kwargs.items():
+            if not hasattr(self, k) or k.startswith("_"):
+                raise ValueError(f"Unknown client option: {k}")
+            setattr(self, k, v)
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+CLIENT_MANAGER=LLMClientManager()
+
+
+def get_client() -> OpenAI:
+    return CLIENT_MANAGER.get()
+
+
+class MalformedJSONError(ValueError):
+    """要求 json_object 输出，但模型返回的内容无法解析。"""
+
+
+def _check_json(resp, response_format):
+    if response_format is None or response_format.get("type") != "json_object":
+        return
+    try:
+        json.loads(resp)
+    except (TypeError, ValueError) as e:
+        raise MalformedJSONError(f"Malformed JSON response: {e}") from e
+
+
+def classify_error(e) -> str:
+    """把异常归类为 rate_limit / timeout / server / connection / malformed_json / fatal。"""
+    if isinstance(e, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(e, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(e, openai.APIConnectionError):
+        return "connection"
+    if isinstance(e, openai.APIStatusError) and e.status_code >= 500:
+        return "server"
+    if isinstance(e, MalformedJSONError):
+        return "malformed_json"
+    return "fatal"
+
+
+def _retry_after(e):
+    """从 429/503 响应头中读取 Retry-After（秒），没有则返回 None。"""
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    指数退避 + full jitter 的重试策略。
+
+    - fatal 类错误（400/401 等）不重试；
+    - 有 Retry-After 时按服务端给的时间等待，但不超过 max_delay（被截断的次数记在 stats 里）；
+    - retry_budget 是整个进程共享的重试总次数，用完之后不再重试，
+      避免服务整体不可用时每个句子都白白等满 max_attempts 次；
+    - stats 记录各类错误的出现次数、重试次数、放弃次数和等待时间。
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0,
+                 retry_budget=500):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _next_delay(self, e, kind, attempt):
+        """返回下一次重试前的等待秒数；返回 None 表示放弃。"""
+        with self._lock:
+            self.stats[f"{kind}:errors"] += 1
+            if kind == "fatal" or attempt + 1 >= self.max_attempts \
+                    or self.retry_budget <= 0:
+                self.stats[f"{kind}:gave_up"] += 1
+                return None
+            self.retry_budget -= 1
+            self.stats[f"{kind}:retries"] += 1
+        delay = _retry_after(e)
+        clamped = delay is not None and delay > self.max_delay
+        if delay is None:
+            cap = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay = random.uniform(0, cap)
+        delay = min(delay, self.max_delay)
+        with self._lock:
+            if clamped:
+                self.stats[f"{kind}:retry_after_clamped"] += 1
+            self.stats[f"{kind}:wait_seconds"] += delay
+        return delay
+
+    def call(self, fn):
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._next_delay(e, classify_error(e), attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def acall(self, coro_fn):
+        attempt = 0
+        while True:
+            try:
+                return await coro_fn()
+            except Exception as e:
+                delay = self._next_delay(e, classify_error(e), attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def report(self):
+        if not self.stats:
+            return "Retries: none."
+        items = ", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}"
+                          for k, v in sorted(self.stats.items()))
+        return f"Retries: {items} (budget left {self.retry_budget})"
+
+
+RETRY_POLICY=RetryPolicy()
+
+
+def _chat(prompt, user_input, response_format=None):
+    cache=get_cache()
+    if cache is not None:
+        resp=cache.get(MODEL_NAME, prompt, user_input, response_format)
+        if resp is not None:
+            return resp
+
+    kwargs={}
+    if response_format is not None:
+        kwargs["response_format"]=response_format
+
+    def request():
+        completion = get_client().chat.completions.create(
+            model = MODEL_NAME,
+            messages = [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": user_input}
+            ],
+            **kwargs,
+        )
+        resp=completion.choices[0].message.content
+        _check_json(resp, response_format)
+        return resp
+
+    resp=RETRY_POLICY.call(request)
+    if cache is not None and resp is not None:
+        cache.put(MODEL_NAME, prompt, user_input, response_format, resp)
     return resp
 
+
+def estimate_tokens(text):
+    """粗略估计 token 数：日文/中文大约一字一 token，偏保守。"""
+    return len(text)
+
+
+class TokenBucket:
+    """
+    令牌桶限流器。rate_per_min 为 None 时不限流。
+    acquire 时按估计量扣除，请求结束后可用 adjust 按实际用量修正。
+    """
+
+    def __init__(self, rate_per_min=None, capacity=None):
+        self.rate_per_min = rate_per_min
+        if rate_per_min is None:
+            return
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity or rate_per_min
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        if self.rate_per_min is None:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta):
+        """delta > 0 表示实际用量比预扣的多，允许余额暂时为负。"""
+        if self.rate_per_min is None:
+            return
+        self._refill()
+        self.tokens -= delta
+
+
+def group_duplicates(inputs):
+    """{输入: [出现的行号, ...]}，按首次出现的顺序排列。"""
+    groups = {}
+    for idx, x in enumerate(inputs):
+        groups.setdefault(x, []).append(idx)
+    return groups
+
+
+def report_dedup(desc, n_rows, n_unique):
+    print(f"{desc} dedup: {n_rows} rows -> {n_unique} unique requests "
+          f"({n_rows - n_unique} calls saved).")
+
+
+class LLMDispatcher:
+    """
+    并发调度器：最多 max_in_flight 个请求同时在途，
+    同时受 requests/min 与 tokens/min 两个令牌桶约束。
+    map() 的输出顺序与输入顺序一致，失败的条目以异常对象占位；
+    相同的输入只请求一次，结果分发回所有对应的行。
+    """
+
+    def __init__(self,
+                 max_in_flight=8,
+                 requests_per_min=200,
+                 tokens_per_min=None,
+                 expected_output_tokens=512):
+        self.max_in_flight = max_in_flight
+        self.requests_per_min = requests_per_min
+        self.tokens_per_min = tokens_per_min
+        self.expected_output_tokens = expected_output_tokens
+
+    async def _call(self, client, request_bucket, token_bucket,
+                    prompt, user_input, response_format):
+        cache = get_cache()
+        if cache is not None:
+            resp = cache.get(MODEL_NAME, prompt, user_input, response_format)
+            if resp is not None:
+                return resp
+
+        estimated = (estimate_tokens(prompt) + estimate_tokens(user_input)
+                     + self.expected_output_tokens)
+        kwargs = {}
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+
+        async def request():
+            # 每次重试都重新排队领取令牌，避免重试风暴冲破限流
+            await request_bucket.acquire(1)
+            await token_bucket.acquire(estimated)
+            completion = await client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": user_input}
+                ],
+                **kwargs,
+            )
+            if completion.usage is not None:
+                token_bucket.adjust(completion.usage.total_tokens - estimated)
+            resp = completion.choices[0].message.content
+            _check_json(resp, response_format)
+            return resp
+
+        resp = await RETRY_POLICY.acall(request)
+        if cache is not None and resp is not None:
+            cache.put(MODEL_NAME, prompt, user_input, response_format, resp)
+        return resp
+
+    async def _map(self, prompt, inputs, response_format, desc, on_result):
+        results = [None] * len(inputs)
+        groups = group_duplicates(inputs)
+        report_dedup(desc, len(inputs), len(groups))
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        request_bucket = TokenBucket(self.requests_per_min)
+        token_bucket = TokenBucket(self.tokens_per_min)
+
+        async with CLIENT_MANAGER.new_async() as client:
+            with tqdm(total=len(groups), desc=desc) as bar:
+                async def worker(user_input, positions):
+                    async with semaphore:
+                        try:
+                            resp = await self._call(
+                                client, request_bucket, token_bucket,
+                                prompt, user_input, response_format)
+                        except Exception as e:
+                            resp = e
+                    for idx in positions:
+                        results[idx] = resp
+                    if on_result is not None \
+                            and not isinstance(resp, Exception):
+                        for idx in positions:
+                            on_result(idx, resp)
+                    bar.update(1)
+
+                await asyncio.gather(
+                    *(worker(x, pos) for x, pos in groups.items()))
+
+        cache = get_cache()
+        if cache is not None:
+            print(f"LLM cache: {cache.hits} hits / {cache.misses} misses")
+        print(RETRY_POLICY.report())
+        return results
+
+    def map(self, prompt, inputs, response_format=None, desc="LLM",
+            on_result=None):
+        """
+        on_result(idx, response) 在每个请求成功返回后立即调用，
+        可用于逐条写 checkpoint。
+        """
+        return asyncio.run(
+            self._map(prompt, list(inputs), response_format, desc, on_result))
+
+
+DISPATCHER=LLMDispatcher()
+
+
+def one_time_LLM(prompt,user_input):
+    return _chat(prompt, user_input)
+
 def LLM_trans(user_input):
     return one_time_LLM(TEXT_TRANS, user_input)
 
@@ -46,48 +472,151 @@ def LLM_V_analysis(user_input, version="v1"):
         prompt=TEXT_VV_JAN
     else:
         prompt=TEXT_VV_V2_JAN
-    client = OpenAI(
-        api_key=API_KEY, # 
-        base_url="https://api.moonshot.cn/v1",
-        # base_url="https://api.deepseek.com",
-    )
-    completion = client.chat.completions.create(
-        # model = "kimi-k2-turbo-preview",
-        model = "kimi-k2-0905-preview",
-        # model = "deepseek-chat",
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": user_input}
-        ],
-        response_format={"type":"json_object"}
-    )
-    resp=completion.choices[0].message.content
+    resp=_chat(prompt, user_input, response_format={"type":"json_object"})
     print(type(resp))
     print(resp)
     return resp
-    
+
 
 def LLM_V_analysis_withV(user_input):
     prompt=TEXT_V_WITH_V
-    client = OpenAI(
-        api_key=API_KEY, # 
-        base_url="https://api.moonshot.cn/v1",
-        # base_url="https://api.deepseek.com",
-    )
-    completion = client.chat.completions.create(
-        # model = "kimi-k2-turbo-preview",
-        model = "kimi-k2-0905-preview",
-        # model = "deepseek-chat",
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": user_input}
-        ],
-        response_format={"type":"json_object"}
-    )
-    resp=completion.choices[0].message.content
+    resp=_chat(prompt, user_input, response_format={"type":"json_object"})
     print(type(resp))
     print(resp)
     return resp
 
 
+# ------------------------ Batch (concurrent) versions ---------------
+# 返回值与输入一一对应；失败的条目是 Exception 对象，由调用方决定如何记录。
+
+def LLM_trans_many(user_inputs, dispatcher=None, on_result=None):
+    dispatcher = dispatcher or DISPATCHER
+    return dispatcher.map(TEXT_TRANS, user_inputs,
+                          desc="Translation Procedure:",
+                          on_result=on_result)
+
+
+def LLM_V_analysis_many(user_inputs, version="v1", dispatcher=None,
+                        on_result=None):
+    dispatcher = dispatcher or DISPATCHER
+    if version=="v1":
+        prompt=TEXT_VV_JAN
+    else:
+        prompt=TEXT_VV_V2_JAN
+    return dispatcher.map(prompt, user_inputs,
+                          response_format={"type":"json_object"},
+                          desc="Analysis Procedure:",
+                          on_result=on_result)
+
+
+def LLM_V_analysis_withV_many(user_inputs, dispatcher=None, on_result=None):
+    dispatcher = dispatcher or DISPATCHER
+    return dispatcher.map(TEXT_V_WITH_V, user_inputs,
+                          response_format={"type":"json_object"},
+                          desc="Analysis Procedure:",
+                          on_result=on_result)
+
+
+# ------------------------ Multi-sentence batching -------------------
+
+# 各版本 prompt 输出格式(B)里每一节必须有的字段
+V_ANALYSIS_KEYS={
+    "v1": {"前項動詞": ("result", "reason"),
+           "語彙素": ("result", "reason"),
+           "自他性判断": ("result", "reason"),
+           "格助詞判断": ("result", "reason")},
+    "v2": {"前項動詞": ("result", "reason"),
+           "語彙素": ("result", "reason"),
+           "自他性判断": ("result1", "result2", "reason"),
+           "格助詞判断": ("result", "description", "reason")},
+}
+
+
+def _split_batch_response(resp, ids, version="v1"):
+    """
+    把批量回复拆回单句：返回 {id: 单句 JSON 字符串}，
+    只保留 id 在本批次内、且各节字段与 V_ANALYSIS_KEYS[version] 对得上的条目；
+    缺字段的句子交给单句调用重做。
+    """
+    required = V_ANALYSIS_KEYS["v1" if version == "v1" else "v2"]
+    try:
+        entries = json.loads(resp)["results"]
+    except (TypeError, ValueError, KeyError):
+        return {}
+    if not isinstance(entries, list):
+        return {}
+
+    split = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        sid = str(entry.pop("id", ""))
+        if sid not in ids or sid in split:
+            continue
+        if not all(isinstance(entry.get(k), dict)
+                   and all(f in entry[k] for f in fields)
+                   for k, fields in required.items()):
+            continue
+        split[sid] = json.dumps(entry, ensure_ascii=False)
+    return split
+
+
+def LLM_V_analysis_batched(user_inputs, version="v1", batch_size=8,
+                           dispatcher=None, on_result=None):
+    """
+    与 LLM_V_analysis_many 相同的输入输出，但每个请求打包 batch_size 个句子，
+    system prompt 只发送一次。批量回复中缺失或格式不对的句子
+    自动退回到单句调用。
+    """
+    dispatcher = dispatcher or DISPATCHER
+    all_inputs = list(user_inputs)
+    groups = group_duplicates(all_inputs)
+    report_dedup("Batched Analysis", len(all_inputs), len(groups))
+    user_inputs = list(groups)
+    positions = list(groups.values())
+
+    def fan_out(i, resp):
+        if on_result is not None:
+            for idx in positions[i]:
+                on_result(idx, resp)
+
+    if version=="v1":
+        prompt=TEXT_VV_BATCH_JAN
+    else:
+        prompt=TEXT_VV_V2_BATCH_JAN
+
+    batches = [list(range(i, min(i + batch_size, len(user_inputs))))
+               for i in range(0, len(user_inputs), batch_size)]
+    payloads = [json.dumps([{"id": str(i), "text": user_inputs[i]}
+                            for i in batch], ensure_ascii=False)
+                for batch in batches]
+    results = [None] * len(user_inputs)
+
+    def on_batch(b, resp):
+        split = _split_batch_response(resp, {str(i) for i in batches[b]},
+                                      version)
+        for i in batches[b]:
+            if str(i) in split:
+                results[i] = split[str(i)]
+                fan_out(i, results[i])
+
+    dispatcher.map(prompt, payloads,
+                   response_format={"type":"json_object"},
+                   desc="Batched Analysis Procedure:",
+                   on_result=on_batch)
+
+    fallback = [i for i, r in enumerate(results) if r is None]
+    print(f"Batched analysis: {len(user_inputs) - len(fallback)} sentences "
+          f"in {len(batches)} requests, {len(fallback)} fall back to single calls.")
+    if fallback:
+        singles = LLM_V_analysis_many(
+            [user_inputs[i] for i in fallback], version, dispatcher,
+            lambda j, resp: fan_out(fallback[j], resp))
+        for i, resp in zip(fallback, singles):
+            results[i] = resp
 
+    all_results = [None] * len(all_inputs)
+    for i, resp in enumerate(results):
+        for idx in positions[i]:
+            all_results[idx] = resp
+    return all_results
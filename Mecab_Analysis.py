@@ -13,16 +13,161 @@ MECAB_ANALYSIS ---
 
 import subprocess
 import platform
-from typing import List, Dict, Optional
+import threading
+import os
+import sys
+import json
+from multiprocessing import Pool
+
+from parse_cache import get_parse_cache, reset_parse_cache, tool_version
+from typing import Iterable, List, Dict, Optional
+
+
+class MeCabToken:
+    """
+    MeCab 解析出的一个词。用 __slots__ 代替原来的 7 键字典，
+    品词类字段用 sys.intern 共享同一个字符串对象，整库解析时省内存。
+    仍支持 token["pos"] 这种字典式读取，兼容旧代码。
+    """
+
+    __slots__ = ("surface", "base_form", "pos", "pos_sub1", "pos_sub2",
+                 "conjugation_type", "conjugation_form")
+
+    def __init__(self, surface, base_form, pos, pos_sub1, pos_sub2,
+                 conjugation_type, conjugation_form):
+        intern = sys.intern
+        self.surface = surface                      # 表層形（如「読んだ」）
+        self.base_form = base_form                  # 原形（如「読む」）
+        self.pos = intern(pos)                      # 品詞（如「動詞」「助詞」）
+        self.pos_sub1 = intern(pos_sub1)            # 品詞細分類1（如「自立」「格助詞」）
+        self.pos_sub2 = intern(pos_sub2)            # 品詞細分類2（如「一般」）
+        self.conjugation_type = intern(conjugation_type)  # 活用型（如「五段・ヨ行」）
+        self.conjugation_form = intern(conjugation_form)  # 活用形（如「基本形」）
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __eq__(self, other):
+        if not isinstance(other, MeCabToken):
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    def __repr__(self):
+        return f"MeCabToken{self.to_tuple()!r}"
+
+    def to_tuple(self) -> tuple:
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def to_dict(self) -> Dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+# 一批写入 mecab stdin 的上限（字节）。小于管道缓冲区（Linux 64 KiB，macOS 最少 16 KiB），
+# 这样无论 mecab 输出多少，write 都不会阻塞
+_PIPE_BATCH_BYTES = 8192
+
+
+def _pipe_batches(lines: List[str]):
+    """把输入行切成每批不超过 _PIPE_BATCH_BYTES 的若干批；单行超长时自成一批"""
+    batch, size = [], 0
+    for line in lines:
+        n = len(line.encode("utf-8")) + 1
+        if batch and size + n > _PIPE_BATCH_BYTES:
+            yield batch
+            batch, size = [], 0
+        batch.append(line)
+        size += n
+    if batch:
+        yield batch
+
+
+class MeCabWorker:
+    """
+    长驻的 mecab 子进程：句子逐行写入 stdin，从 stdout 读到 EOS 为止，
+    避免每个句子都重新启动进程、重新加载词典。
+    子进程意外退出时自动重启并重试一次。
+    """
+
+    def __init__(self, cmd: List[str]):
+        self.cmd = list(cmd)
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            encoding="utf-8",
+            errors="ignore",
+            bufsize=1,  # 行缓冲
+        )
+
+    def close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=5)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+
+    def _roundtrip(self, lines: List[str]) -> List[str]:
+        if self._proc is None or self._proc.poll() is not None:
+            self._start()
+        # 分批写入，每批读完它的 EOS 再写下一批：一次写太多时 mecab 的 stdout 先写满、
+        # 不再读 stdin，这边又卡在 write 上，两边互相等死
+        output = []
+        for batch in _pipe_batches(lines):
+            self._proc.stdin.write("".join(line + "\n" for line in batch))
+            self._proc.stdin.flush()
+
+            # mecab 对每个输入行输出一个 EOS
+            remaining = len(batch)
+            while remaining:
+                out = self._proc.stdout.readline()
+                if not out:
+                    raise BrokenPipeError("mecab exited unexpectedly")
+                out = out.rstrip("\n")
+                if out == "EOS":
+                    remaining -= 1
+                else:
+                    output.append(out)
+        return output
+
+    def parse(self, text: str) -> List[str]:
+        """返回 mecab 对 text 的原始输出行（不含 EOS）。"""
+        text = text.strip()
+        if not text:
+            return []
+        lines = text.splitlines()
+        with self._lock:
+            try:
+                return self._roundtrip(lines)
+            except (BrokenPipeError, OSError):
+                self.close()
+                return self._roundtrip(lines)
+
+
+_NOT_GIVEN = object()
+
 
 class MeCabJapaneseAnalyzer:
-    def __init__(self, mecab_path: Optional[str] = None):
+    def __init__(self, mecab_path: Optional[str] = None,
+                 use_parse_cache: bool = True):
         """
         初始化 MeCab 分析器
         :param mecab_path: MeCab 可执行文件路径（Windows 需指定，如 "C:\\Program Files\\MeCab\\bin\\mecab.exe"）
+        :param use_parse_cache: 是否使用 parse_cache 中的磁盘缓存（同一句子只解析一次）
         """
         # 自动适配系统的 MeCab 路径
-        self.mecab_cmd = "mecab"
+        self.mecab_cmd = mecab_path or "mecab"
+        self._worker = None
+        self.use_parse_cache = use_parse_cache
+        self._dict_version = None
 
         # 1. 自他性规则库（基于 IPA 辞書高频动词，可根据需求扩展）
         self.transitivity_dict = {
@@ -43,24 +188,39 @@ class MeCabJapaneseAnalyzer:
         # 2. 目标格助词列表（需分析的7类格助词）
         self.target_particles = {"が", "を", "に", "へ", "から", "と", "で"}
 
-    def _parse_mecab_output(self, text: str) -> List[Dict]:
+    def _parse_mecab_output(self, text: str) -> List[MeCabToken]:
         """
         调用 MeCab 命令行，解析日语文本并返回结构化结果
         :param text: 待分析的日语句子（如「昨日、本を読んだ」）
-        :return: 结构化列表，每个元素为一个词的属性字典
+        :return: 结构化列表，每个元素为一个词（MeCabToken）
         """
-        # 调用 MeCab 命令，指定输出格式为 IPA 辞書标准格式（表層形\t品詞,品詞細分類1,...）
-        result = subprocess.run(
-            [self.mecab_cmd, "-O", "chasen"],  # -O chasen 确保输出包含完整品词信息
-            input=text.strip(),
-            capture_output=True,
-            encoding="utf-8",
-            errors="ignore"
-        )
+        cache = get_parse_cache() if self.use_parse_cache else None
+        if cache is not None:
+            hit = cache.get(text, "mecab", self.dictionary_version())
+            if hit is not None:
+                return [MeCabToken(*fields) for fields in json.loads(hit)]
+
+        if self._worker is None:
+            # -O chasen 确保输出包含完整品词信息
+            self._worker = MeCabWorker([self.mecab_cmd, "-O", "chasen"])
+        parsed_data = self._parse_chasen_lines(self._worker.parse(text))
+
+        if cache is not None:
+            cache.put(text, "mecab", self.dictionary_version(),
+                      json.dumps([t.to_tuple() for t in parsed_data],
+                                 ensure_ascii=False))
+        return parsed_data
+
+    def dictionary_version(self) -> str:
+        """`mecab -D` 的输出（词典文件、版本、字符集），作为缓存 key 的一部分"""
+        if self._dict_version is None:
+            self._dict_version = tool_version([self.mecab_cmd, "-D"])
+        return self._dict_version
 
-        # 处理 MeCab 输出（排除 EOS 行和空行）
+    def _parse_chasen_lines(self, lines: Iterable[str]) -> List[MeCabToken]:
+        """把 MeCab 的原始输出行解析成 MeCabToken 列表（排除 EOS 行和空行）"""
         parsed_data = []
-        for line in result.stdout.splitlines():
+        for line in lines:
             line = line.strip()
             if not line or line == "EOS":
                 continue
@@ -70,32 +230,39 @@ class MeCabJapaneseAnalyzer:
             if len(parts) < 10:
                 continue  # 跳过格式异常的行
             
-            # 提取核心属性
-            word_attr = {
-                "surface": parts[0],          # 表層形（句子中实际出现的形式，如「読んだ」）
-                "base_form": parts[9],       # 原形（动词原形，如「読む」）
-                "pos": parts[3],             # 品詞（如「動詞」「助詞」）
-                "pos_sub1": parts[4],        # 品詞細分類1（如「自立」「格助詞」）
-                "pos_sub2": parts[5],        # 品詞細分類2（如「五段・ヨ行」「一般」）
-                "conjugation_type": parts[7],# 活用型（如「五段・ヨ行」「サ変・スル」）
-                "conjugation_form": parts[8] # 活用形（如「連用タ接続」「基本形」）
-            }
-            parsed_data.append(word_attr)
+            parsed_data.append(MeCabToken(
+                parts[0],   # 表層形
+                parts[9],   # 原形
+                parts[3],   # 品詞
+                parts[4],   # 品詞細分類1
+                parts[5],   # 品詞細分類2
+                parts[7],   # 活用型
+                parts[8],   # 活用形
+            ))
         
         return parsed_data
 
-    def extract_main_verb(self, parsed_data: List[Dict]) -> Optional[Dict]:
+    def parse_many(self, texts: Iterable[str]) -> List[List[MeCabToken]]:
+        """批量解析，复用同一个 mecab 进程"""
+        return [self._parse_mecab_output(text) for text in texts]
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+
+    def extract_main_verb(self, parsed_data: List[MeCabToken]) -> Optional[MeCabToken]:
         """
         从解析结果中提取前项动词（核心动词，排除伴随动词、补助动词）
         :param parsed_data: MeCab 结构化解析结果
-        :return: 前项动词的属性字典（无则返回 None）
+        :return: 前项动词（无则返回 None）
         """
         # 筛选所有动词（品詞为「動詞」），优先选择句末、自立性动词（排除补助动词）
         verbs = [
             word for word in parsed_data 
-            if word["pos"] == "動詞" 
-            and word["pos_sub1"] == "自立"  # 排除「ている」「てある」等非自立补助动词
-            and "基本形" in word["conjugation_form"] or "連用タ接続" in word["conjugation_form"]  # 常见核心动词活用形
+            if word.pos == "動詞" 
+            and word.pos_sub1 == "自立"  # 排除「ている」「てある」等非自立补助动词
+            and "基本形" in word.conjugation_form or "連用タ接続" in word.conjugation_form  # 常见核心动词活用形
         ]
 
         # 日语核心动词多位于句末，取最后一个符合条件的动词作为前项动词
@@ -111,36 +278,38 @@ class MeCabJapaneseAnalyzer:
         """
         return self.transitivity_dict.get(verb_base, "需手动确认")
 
-    def analyze_case_particles(self, parsed_data: List[Dict]) -> List[Dict]:
+    def analyze_case_particles(self, parsed_data: List[MeCabToken],
+                               main_verb=_NOT_GIVEN) -> List[Dict]:
         """
         分析句子中的格助词，识别其依存关系（直接依存词、最终依存动词）
         :param parsed_data: MeCab 结构化解析结果
+        :param main_verb: 已经由 extract_main_verb 得到的核心动词（可为 None），
+                          不传时在这里重新提取
         :return: 格助词分析列表，每个元素包含格助词属性和依存关系
         """
         particle_analysis = []
-        main_verb = self.extract_main_verb(parsed_data)  # 核心动词（格助词最终依存目标）
-        main_verb_base = main_verb["base_form"] if main_verb else "未识别核心动词"
+        if main_verb is _NOT_GIVEN:
+            main_verb = self.extract_main_verb(parsed_data)  # 核心动词（格助词最终依存目标）
+        main_verb_base = main_verb.base_form if main_verb else "未识别核心动词"
 
-        # 遍历解析结果，定位目标格助词并分析依存
-        for idx, word in enumerate(parsed_data):
+        # 单次遍历：一边走一边记住最近出现的名词，格助词的直接依存词就是它
+        last_noun = None
+        for word in parsed_data:
             # 筛选目标格助词（品詞为「助詞」且品詞細分類1为「格助詞」，且表層形在目标列表中）
-            if word["pos"] == "助詞" and word["pos_sub1"] == "格助詞" and word["surface"] in self.target_particles:
-                # 1. 直接依存词：格助词前的名词（如「本を」中「を」的直接依存词是「本」）
-                dependent_noun = None
-                if idx > 0:  # 向前查找最近的名词
-                    for prev_word in reversed(parsed_data[:idx]):
-                        if prev_word["pos"].startswith("名詞"):  # 匹配名词（一般/固有名詞等）
-                            dependent_noun = prev_word["surface"]
-                            break
+            if word.pos == "助詞" and word.pos_sub1 == "格助詞" and word.surface in self.target_particles:
+                # 1. 直接依存词：格助词前最近的名词（如「本を」中「を」的直接依存词是「本」）
+                dependent_noun = last_noun
 
                 # 2. 构建格助词分析结果
                 particle_info = {
-                    "particle": word["surface"],          # 格助词（如「を」）
+                    "particle": word.surface,          # 格助词（如「を」）
                     "direct_dependent": dependent_noun or "未识别名词",  # 直接依存名词
                     "final_dependent_verb": main_verb_base,  # 最终依存动词（核心动词）
-                    "particle_function": self._get_particle_function(word["surface"], dependent_noun, main_verb_base)  # 格助词功能
+                    "particle_function": self._get_particle_function(word.surface, dependent_noun, main_verb_base)  # 格助词功能
                 }
                 particle_analysis.append(particle_info)
+            elif word.pos.startswith("名詞"):  # 匹配名词（一般/固有名詞等）
+                last_noun = word.surface
         
         return particle_analysis
 
@@ -152,6 +321,7 @@ class MeCabJapaneseAnalyzer:
         :param main_verb: 核心动词（如「行く」）
         :return: 格助词功能说明（如「目的地」）
         """
+        dependent_noun = dependent_noun or ""  # 前面没有名词时，下面的 in 判断不能用 None
         function_map = {
             "が": "主格（动作主体，如「誰が～する」）",
             "を": "宾格（动作对象，如「何を～する」）",
@@ -204,17 +374,17 @@ class MeCabJapaneseAnalyzer:
         # 2. 提取前项动词
         main_verb = self.extract_main_verb(parsed_data)
         if main_verb:
-            verb_surface = main_verb["surface"]  # 句子中出现的形态（如「読んだ」）
-            verb_base = main_verb["base_form"]   # 动词原形（如「読む」）
+            verb_surface = main_verb.surface  # 句子中出现的形态（如「読んだ」）
+            verb_base = main_verb.base_form   # 动词原形（如「読む」）
             # 获取 IPA 辞書语义分类（品詞→細分類1→細分類2→活用型）
-            ipa_category = f"品詞→{main_verb['pos']} → 品詞細分類1→{main_verb['pos_sub1']} → 品詞細分類2→{main_verb['pos_sub2']} → 活用型→{main_verb['conjugation_type']}"
+            ipa_category = f"品詞→{main_verb.pos} → 品詞細分類1→{main_verb.pos_sub1} → 品詞細分類2→{main_verb.pos_sub2} → 活用型→{main_verb.conjugation_type}"
             # 判断自他性
             transitivity = self.judge_transitivity(verb_base)
         else:
             verb_surface = verb_base = ipa_category = transitivity = "未识别前项动词"
 
         # 3. 格助词分析
-        particle_analysis = self.analyze_case_particles(parsed_data)
+        particle_analysis = self.analyze_case_particles(parsed_data, main_verb)
         # 统计未出现的格助词
         used_particles = {p["particle"] for p in particle_analysis}
         unused_particles = [p for p in self.target_particles if p not in used_particles]
@@ -233,6 +403,52 @@ class MeCabJapaneseAnalyzer:
         }
 
 
+# ------------------- 多进程批量分析 -------------------
+# 每个子进程持有自己的 MeCabJapaneseAnalyzer（及其长驻 mecab 进程）
+_POOL_ANALYZER: Optional[MeCabJapaneseAnalyzer] = None
+
+
+def _init_pool_worker(mecab_path: Optional[str], use_parse_cache: bool):
+    global _POOL_ANALYZER
+    # Linux 下进程池是 fork 出来的，父进程若已打开默认缓存，子进程必须自己重新打开
+    reset_parse_cache()
+    _POOL_ANALYZER = MeCabJapaneseAnalyzer(mecab_path, use_parse_cache)
+
+
+def _analyze_in_worker(text: str) -> Dict:
+    return _POOL_ANALYZER.full_analysis(text)
+
+
+def analyze_corpus(texts: Iterable[str],
+                   workers: Optional[int] = None,
+                   chunksize: Optional[int] = None,
+                   mecab_path: Optional[str] = None,
+                   use_parse_cache: bool = True) -> List[Dict]:
+    """
+    用进程池对整个语料做 full_analysis，结果顺序与输入一致
+    :param texts: 句子列表
+    :param workers: 进程数，默认使用全部 CPU 核；1 表示在当前进程里顺序执行
+    :param chunksize: 每次派发给子进程的句子数，默认约为 len(texts) / (workers * 4)
+    :param mecab_path: 同 MeCabJapaneseAnalyzer
+    :param use_parse_cache: 同 MeCabJapaneseAnalyzer
+    :return: 每个句子的 full_analysis 结果
+    """
+    texts = list(texts)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        analyzer = MeCabJapaneseAnalyzer(mecab_path, use_parse_cache)
+        try:
+            return [analyzer.full_analysis(text) for text in texts]
+        finally:
+            analyzer.close()
+
+    if chunksize is None:
+        chunksize = max(1, len(texts) // (workers * 4))
+    with Pool(workers, initializer=_init_pool_worker,
+              initargs=(mecab_path, use_parse_cache)) as pool:
+        return list(pool.imap(_analyze_in_worker, texts, chunksize=chunksize))
+
+
 # ------------------- 示例：使用脚本进行分析 -------------------
 if __name__ == "__main__":
     # 1. 初始化分析器（Windows 若自定义 MeCab 路径，需传入 mecab_path 参数，如：
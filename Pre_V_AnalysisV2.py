@@ -14,12 +14,12 @@ New version of Pre-V Analysis.
 # ------------------------ Code --------------------------------------
 
 import pandas as pd
-from tqdm import tqdm
-import time
+import argparse
 import json
+from functools import partial
 
-from API import LLM_trans
-from API import LLM_V_analysis
+from checkpoint import run_with_checkpoint, is_json
+from API import LLM_V_analysis_many, LLM_V_analysis_batched
 
 """
 前项动词分析（词频+词义+词性）
@@ -29,7 +29,7 @@ from API import LLM_V_analysis
     - 前项动词自他性【自动词（意志）/自动词（无意志）/他动词】
 """
 
-def run():
+def run(resume=False, batch_size=1):
     df = pd.read_excel('./data_old/BCCWJ1313--2.xlsx', sheet_name='bccwj1313')
     # df = pd.read_excel('./data_old/CHJ376--2.xlsx', sheet_name='chj376')
     # df = pd.read_excel('./data_old/SHC508--2.xlsx', sheet_name='shc508')
@@ -40,13 +40,19 @@ def run():
     print("Overall Length: ", len(temp_ls))
     analysis_ls=[]
 
-    i=0
+    if batch_size>1:
+        call_many=partial(LLM_V_analysis_batched, version="v2",
+                          batch_size=batch_size)
+    else:
+        call_many=partial(LLM_V_analysis_many, version="v2")
+    responses=run_with_checkpoint(temp_ls, call_many,
+                                  f"AnalysisV2-{len(temp_ls)}",
+                                  resume=resume, validate=is_json)
 
-    for jp_text in tqdm(temp_ls,desc="Analysis Procedure:"):
-        i+=1
+    for code_after_analysis in responses:
         try:
-            code_after_analysis=LLM_V_analysis(jp_text, "v2")
-
+            if isinstance(code_after_analysis, Exception):
+                raise code_after_analysis
             code_after_analysis=json.loads(code_after_analysis)
 
             # Do error check:
@@ -125,7 +131,6 @@ def run():
         }
             
         analysis_ls.append(code_after_analysis)
-        time.sleep(0.3)
 
     assert len(temp_ls)==len(analysis_ls)
     # Export to excel.
@@ -185,7 +190,13 @@ def run():
 
 
 if __name__=="__main__":
-    run()
+    parser=argparse.ArgumentParser()
+    parser.add_argument("--resume", action="store_true",
+                        help="skip rows already recorded in the checkpoint journal")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="sentences packed into one LLM request")
+    args=parser.parse_args()
+    run(resume=args.resume, batch_size=args.batch_size)
 
 
 
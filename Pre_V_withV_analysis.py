@@ -13,12 +13,11 @@ PRE_V_WITHV_ANALYSIS ---
 
 
 import pandas as pd
-from tqdm import tqdm
-import time
+import argparse
 import json
 
-from API import LLM_trans
-from API import LLM_V_analysis_withV
+from checkpoint import run_with_checkpoint, is_json
+from API import LLM_V_analysis_withV_many
 
 """
 前项动词分析（词频+词义+词性）
@@ -26,7 +25,7 @@ from API import LLM_V_analysis_withV
     - 格助词分析
 """
 
-def run():
+def run(resume=False):
     df = pd.read_excel('./data_new/5-BCCWJ1313.xlsx', sheet_name='bccwj1313')
     # df = pd.read_excel('./data_old/CHJ376--2.xlsx', sheet_name='chj376')
     # df = pd.read_excel('./data_old/SHC508--2.xlsx', sheet_name='shc508')
@@ -39,13 +38,17 @@ def run():
     print("Overall Length: ", len(temp_ls))
     analysis_ls=[]
 
-    i=0
+    query_ls=[f"待分析语句：{jp_text}\n前项动词：{v_ls[index]}"
+              for index, jp_text in enumerate(temp_ls)]
 
-    for index, jp_text in enumerate(tqdm(temp_ls,desc="Analysis Procedure:")):
-        i+=1
+    responses=run_with_checkpoint(query_ls, LLM_V_analysis_withV_many,
+                                  f"With前项动词Analysis-{len(temp_ls)}",
+                                  resume=resume, validate=is_json)
+
+    for code_after_analysis in responses:
         try:
-            jp_text=f"待分析语句：{jp_text}\n前项动词：{v_ls[index]}"
-            code_after_analysis=LLM_V_analysis_withV(jp_text)
+            if isinstance(code_after_analysis, Exception):
+                raise code_after_analysis
             code_after_analysis=json.loads(code_after_analysis)
 
         except Exception as e:
@@ -70,7 +73,6 @@ def run():
         }
             
         analysis_ls.append(code_after_analysis)
-        time.sleep(0.3)
 
     assert len(temp_ls)==len(analysis_ls)
     # Export to excel.
@@ -100,7 +102,11 @@ def run():
 
 
 if __name__=="__main__":
-    run()
+    parser=argparse.ArgumentParser()
+    parser.add_argument("--resume", action="store_true",
+                        help="skip rows already recorded in the checkpoint journal")
+    args=parser.parse_args()
+    run(resume=args.resume)
 
 
 
@@ -0,0 +1,870 @@
+"""
+======================================================================
+BENCH ---
+
+Micro benchmarks for the analysis pipelines.
+
+    python bench.py client     # fresh OpenAI client per call vs. pooled client
+    python bench.py dispatch   # sequential loop vs. LLMDispatcher
+    python bench.py dedup      # LLM calls saved by de-duplication, per corpus
+    python bench.py load       # full V analysis against the mock server
+    python bench.py mecab      # mecab subprocess per sentence vs. MeCabWorker
+    python bench.py mecab-pool # analyze_corpus scaling from 1 to all cores
+    python bench.py knp-pool   # serial KNP vs. KNPWorkerPool from 1 to all cores
+    python bench.py knp-features --knp-output out.knp
+                               # substring/regex scans vs. parse_features per tag
+    python bench.py knp-stream --knp-output out.knp
+                               # pyknp BList path vs. raw line reader, time + peak memory
+    python bench.py lexicon-load
+                               # parse SAKUIN/KOUMOKU text vs. compiled cache
+    python bench.py koumoku-tree
+                               # dict scans vs. CategoryTree ancestor/descendant/L1 queries
+    python bench.py supplycls  # per-row SupplyCLS loop vs. joined annotation, 1M rows
+    python bench.py lemma-fallback
+                               # per-tier hit rates of the normalized verb lookup
+    python bench.py lexicon-trie
+                               # dict-of-substrings vs. double-array prefix scans
+    python bench.py komu-scan  # streaming V+こむ scan of 20/100 MiB corpora, time + peak memory
+    python bench.py read-cjk   # whole-file chardet vs. sampled detection + sidecar
+    python bench.py tokens     # dict tokens vs. slotted MeCabToken, 100k sentences
+    python bench.py particles  # backward rescan vs. single-pass case particle scan
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import argparse
+import itertools
+import os
+import statistics
+import time
+
+from mock_llm_server import start_server
+
+os.environ.setdefault("FOR_JAPAN_API_KEY", "sk-mock")
+
+CORPORA = [
+    ("./data_new/5-BCCWJ1313.xlsx", "bccwj1313"),
+    ("./data_new/5-CHJ376.xlsx", "chj376"),
+    ("./data_new/5-SHC508.xlsx", "shc508"),
+]
+
+
+def _report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{name:<16} n={len(latencies):<5} "
+          f"mean={statistics.mean(latencies)*1000:7.2f}ms "
+          f"median={statistics.median(latencies)*1000:7.2f}ms "
+          f"p95={p95*1000:7.2f}ms")
+
+
+def bench_client(n=200):
+    from openai import OpenAI
+    import API
+
+    server, url = start_server()
+    API.BASE_URL = url
+    API.CLIENT_MANAGER.close()
+    messages = [{"role": "system", "content": "s"},
+                {"role": "user", "content": "u"}]
+
+    # 旧做法：每个句子新建一个客户端
+    fresh = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        client = OpenAI(api_key=API.API_KEY, base_url=url)
+        client.chat.completions.create(model=API.MODEL_NAME,
+                                       messages=messages)
+        fresh.append(time.perf_counter() - t0)
+
+    pooled = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        API.one_time_LLM("s", "u")
+        pooled.append(time.perf_counter() - t0)
+
+    _report("fresh client", fresh)
+    _report("pooled client", pooled)
+    API.CLIENT_MANAGER.close()
+    server.shutdown()
+
+
+def bench_dispatch(n=100, latency=0.2, in_flight=16):
+    import API
+
+    server, url = start_server(latency=latency)
+    API.BASE_URL = url
+    API.CLIENT_MANAGER.close()
+    inputs = [f"文{i}" for i in range(n)]
+
+    # 旧做法：逐句调用 + 固定 sleep(0.3)
+    t0 = time.perf_counter()
+    for x in inputs:
+        API.one_time_LLM("s", x)
+        time.sleep(0.3)
+    sequential = time.perf_counter() - t0
+
+    dispatcher = API.LLMDispatcher(max_in_flight=in_flight,
+                                   requests_per_min=None)
+    t0 = time.perf_counter()
+    results = dispatcher.map("s", inputs, desc="dispatch")
+    concurrent = time.perf_counter() - t0
+    assert not any(isinstance(r, Exception) for r in results)
+
+    print(f"sequential  {n} requests: {sequential:6.2f}s")
+    print(f"dispatcher  {n} requests: {concurrent:6.2f}s "
+          f"(in flight={in_flight}, latency={latency*1000:.0f}ms)")
+    API.CLIENT_MANAGER.close()
+    server.shutdown()
+
+
+def bench_load(n=300, latency=0.3, error_rate=0.05, malformed_rate=0.02,
+               rpm=600, batch_size=1):
+    """并发 + 限流 + 重试 + 批量在 mock 服务上的端到端表现。"""
+    import API
+
+    server, url = start_server(latency=latency, jitter=latency / 2,
+                               error_rate=error_rate,
+                               malformed_rate=malformed_rate, rpm=rpm)
+    API.BASE_URL = url
+    API.USE_CACHE = False
+    API.RETRY_POLICY.base_delay = 0.2
+    inputs = [f"文{i}を読み込んだ。" for i in range(n)]
+
+    t0 = time.perf_counter()
+    if batch_size > 1:
+        results = API.LLM_V_analysis_batched(inputs, "v2", batch_size)
+    else:
+        results = API.LLM_V_analysis_many(inputs, "v2")
+    elapsed = time.perf_counter() - t0
+    failed = sum(isinstance(r, Exception) for r in results)
+    print(f"{n} sentences in {elapsed:.2f}s ({n / elapsed:.1f}/s), "
+          f"{failed} failed, batch_size={batch_size}")
+    server.shutdown()
+
+
+def _corpus_sentences():
+    import pandas as pd
+
+    texts = []
+    for path, sheet in CORPORA:
+        df = pd.read_excel(path, sheet_name=sheet)
+        texts.extend(df["合并内容"].dropna().astype(str).tolist())
+    return texts
+
+
+def bench_mecab(n=1000):
+    import subprocess
+    from Mecab_Analysis import MeCabJapaneseAnalyzer
+
+    texts = _corpus_sentences()[:n]
+    analyzer = MeCabJapaneseAnalyzer(use_parse_cache=False)
+
+    # 旧做法：每个句子启动一次 mecab
+    t0 = time.perf_counter()
+    for text in texts:
+        out = subprocess.run([analyzer.mecab_cmd, "-O", "chasen"],
+                             input=text.strip(), capture_output=True,
+                             encoding="utf-8", errors="ignore").stdout
+        analyzer._parse_chasen_lines(out.splitlines())
+    spawn = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    analyzer.parse_many(texts)
+    worker = time.perf_counter() - t0
+    analyzer.close()
+
+    print(f"spawn per sentence  {len(texts)} sentences: {spawn:6.2f}s "
+          f"({len(texts) / spawn:8.1f} sent/s)")
+    print(f"persistent worker   {len(texts)} sentences: {worker:6.2f}s "
+          f"({len(texts) / worker:8.1f} sent/s)")
+
+
+def bench_mecab_pool(chunksizes=(None, 1, 16, 64)):
+    import pandas as pd
+    from Mecab_Analysis import analyze_corpus
+
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, *range(2, cores + 1, 2), cores})
+    for path, sheet in CORPORA:
+        df = pd.read_excel(path, sheet_name=sheet)
+        texts = df["合并内容"].dropna().astype(str).tolist()
+        baseline = None
+        for workers in worker_counts:
+            for chunksize in (chunksizes if workers > 1 else (None,)):
+                t0 = time.perf_counter()
+                analyze_corpus(texts, workers=workers, chunksize=chunksize,
+                               use_parse_cache=False)
+                elapsed = time.perf_counter() - t0
+                baseline = baseline or elapsed
+                print(f"{sheet:<10} workers={workers:<3} "
+                      f"chunksize={str(chunksize):<5} {elapsed:7.2f}s "
+                      f"speedup={baseline / elapsed:5.2f}x")
+
+
+def bench_knp_pool(n=200):
+    from knp_analysis import (batch_extract_predicate_case,
+                              batch_extract_predicate_case_parallel)
+
+    texts = _corpus_sentences()[:n]
+    t0 = time.perf_counter()
+    serial = batch_extract_predicate_case(texts, use_parse_cache=False)
+    baseline = time.perf_counter() - t0
+    print(f"serial      {len(texts)} sentences: {baseline:7.2f}s "
+          f"({len(texts) / baseline:6.1f} sent/s)")
+
+    cores = os.cpu_count() or 1
+    for workers in sorted({1, *range(2, cores + 1, 2), cores}):
+        t0 = time.perf_counter()
+        parallel = batch_extract_predicate_case_parallel(
+            texts, workers=workers, use_parse_cache=False)
+        elapsed = time.perf_counter() - t0
+        assert parallel == serial
+        print(f"workers={workers:<3} {len(texts)} sentences: {elapsed:7.2f}s "
+              f"({len(texts) / elapsed:6.1f} sent/s) "
+              f"speedup={baseline / elapsed:5.2f}x")
+
+
+def _split_knp_output(path):
+    """`knp -tab` 的原始输出（多句拼接）→ 每句一段，含结尾的 EOS 行"""
+    sentences, lines = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            lines.append(line)
+            if line.strip() == "EOS":
+                sentences.append("".join(lines))
+                lines = []
+    return sentences
+
+
+def _extract_case_rescan(parse_result):
+    """旧实现：knp_analysis._extract_single_text_case 改动前的原样拷贝（三次子串查找 + 未编译的 re.findall）。"""
+    import re
+
+    case_results = []
+    
+    # 遍历所有基本句（Tag）定位用言
+    for tag in parse_result.tag_list():
+        tag_fstring = tag.fstring
+        
+        # 筛选用言基本句（动词/形容词/形容动词）
+        if any(marker in tag_fstring for marker in ["<用言:動>", "<用言:形>", "<用言:形動>"]):
+            # 提取用言原形
+            predicate_genkei = None
+            for mrph in tag.mrph_list():
+                if mrph.hinsi in ["動詞", "形容詞", "形容動詞"]:
+                    predicate_genkei = mrph.genkei
+                    break
+            
+            # 提取格解析结果
+            case_matches = re.findall(r"<格解析結果:(.*?)>", tag_fstring)
+            case_relations = []
+            
+            if case_matches:
+                # 拆分格关系（分号分隔多个格）
+                for part in case_matches[0].split(";"):
+                    fields = part.split(":")
+                    if len(fields) >= 5:
+                        case_mark = fields[2].split("/")[0]  # 格標識（ガ/ヲ/ニ等）
+                        case_element = fields[4]             # 格要素（关联名词）
+                        case_relations.append({
+                            "格標識": case_mark,
+                            "格要素": case_element if case_element != "-" else "無"
+                        })
+            
+            # 收集当前用言信息
+            case_results.append({
+                "用言原形": predicate_genkei or "不明",
+                "用言基本句": "".join([mrph.midasi for mrph in tag.mrph_list()]),
+                "格关系列表": case_relations
+            })
+    
+    return case_results
+
+
+def bench_knp_features(knp_output, repeat=20):
+    from pyknp import BList
+    from knp_analysis import _extract_single_text_case
+
+    # pyknp 的对象构建不计入，只比较素性提取本身
+    blists = [BList(raw) for raw in _split_knp_output(knp_output)]
+    n_tags = sum(len(b.tag_list()) for b in blists)
+    assert [_extract_case_rescan(b) for b in blists] == \
+        [_extract_single_text_case(b) for b in blists]
+
+    timings = {}
+    for name, fn in [("rescan", _extract_case_rescan),
+                     ("parse_features", _extract_single_text_case)]:
+        rounds = []
+        for _ in range(5):  # 取最快的一轮，减少噪声
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                for blist in blists:
+                    fn(blist)
+            rounds.append((time.perf_counter() - t0) / repeat)
+        timings[name] = min(rounds)
+        print(f"{name:<15} {len(blists)} sentences / {n_tags} tags: "
+              f"{timings[name] * 1000:8.2f}ms "
+              f"({timings[name] / n_tags * 1e6:6.2f}us/tag)")
+    print(f"speedup {timings['rescan'] / timings['parse_features']:.2f}x")
+
+
+def _iter_knp_sentences(path):
+    """与 _split_knp_output 相同，但逐句产出，不把整个文件读进内存"""
+    with open(path, encoding="utf-8") as f:
+        lines = []
+        for line in f:
+            lines.append(line)
+            if line.strip() == "EOS":
+                yield "".join(lines)
+                lines = []
+
+
+def bench_knp_stream(knp_output):
+    import tracemalloc
+    from pyknp import BList
+    from knp_analysis import (_extract_single_text_case, case_info_to_records,
+                              iter_knp_case_records)
+
+    def via_pyknp():
+        for sentence_id, raw in enumerate(_iter_knp_sentences(knp_output)):
+            yield from case_info_to_records(
+                sentence_id, _extract_single_text_case(BList(raw)))
+
+    def via_raw_lines():
+        with open(knp_output, encoding="utf-8") as f:
+            yield from iter_knp_case_records(f)
+
+    assert all(a == b for a, b in itertools.zip_longest(via_pyknp(),
+                                                         via_raw_lines()))
+    for name, records in [("pyknp BList", via_pyknp),
+                          ("raw lines", via_raw_lines)]:
+        t0 = time.perf_counter()
+        n = sum(1 for _ in records())
+        elapsed = time.perf_counter() - t0
+        # tracemalloc 会拖慢执行，峰值内存单独跑一遍
+        tracemalloc.start()
+        for _ in records():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:<12} {n} records: {elapsed:7.2f}s "
+              f"peak={peak / 2 ** 20:7.2f}MiB")
+
+
+def bench_lexicon_load(repeat=5):
+    import tempfile
+    from utils_cls_parse import (construct_cls_map_dict,
+                                 construct_lexicon_index, load_cls_map_dict,
+                                 load_lexicon_index)
+
+    sakuin, koumoku = "./data_cls/SAKUIN.txt", "./data_cls/KOUMOKU.txt"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, load in [
+            ("parse text", lambda: (construct_lexicon_index(sakuin),
+                                    construct_cls_map_dict(koumoku))),
+            ("compiled", lambda: (load_lexicon_index(sakuin, cache_dir),
+                                  load_cls_map_dict(koumoku, cache_dir))),
+        ]:
+            load()  # 首次调用会写缓存，不计时
+            timings = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                load()
+                timings.append(time.perf_counter() - t0)
+            print(f"{name:<12} best={min(timings) * 1000:8.1f}ms "
+                  f"median={statistics.median(timings) * 1000:8.1f}ms")
+
+
+def _read_cjk_text_full_chardet(path, errors="ignore"):
+    """旧实现（去掉了调试输出）：整个文件交给 chardet，失败再逐个编码重读文件。"""
+    from pathlib import Path
+    from utils_cls_parse import _CJK_ENCODINGS
+
+    path = Path(path)
+    try:
+        import chardet
+        raw = path.read_bytes()
+        det = chardet.detect(raw)
+        if det and det["encoding"]:
+            return raw.decode(det["encoding"], errors=errors)
+    except ImportError:
+        pass
+    for enc in _CJK_ENCODINGS:
+        try:
+            return path.read_text(encoding=enc, errors="strict")
+        except UnicodeDecodeError:
+            continue
+    return path.read_text(encoding="utf-8", errors=errors)
+
+
+def bench_read_cjk(synthetic_mb=100):
+    import tempfile
+    from pathlib import Path
+    from utils_cls_parse import read_cjk_text
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 合成大文件：SAKUIN.txt（CP932）重复到 synthetic_mb MB
+        chunk = Path("./data_cls/SAKUIN.txt").read_bytes()
+        big = Path(tmp) / "synthetic.txt"
+        with open(big, "wb") as f:
+            for _ in range(synthetic_mb * 2 ** 20 // len(chunk) + 1):
+                f.write(chunk)
+        sidecar = Path(tmp) / "encodings.json"
+
+        for path in [Path("./data_cls/SAKUIN.txt"), big]:
+            size = path.stat().st_size / 2 ** 20
+            t0 = time.perf_counter()
+            old = _read_cjk_text_full_chardet(path)
+            t_old = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            cold = read_cjk_text(path, sidecar=sidecar)
+            t_cold = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            warm = read_cjk_text(path, sidecar=sidecar)
+            t_warm = time.perf_counter() - t0
+            assert cold == warm
+            # 旧实现在 chardet 报 SHIFT_JIS 时会丢掉 CP932 特有的字符，结果可能不同
+            print(f"{path.name:<14} {size:7.1f}MB full-chardet={t_old:7.3f}s "
+                  f"sampled={t_cold:7.3f}s sidecar={t_warm:7.3f}s "
+                  f"same_text={old == cold}")
+
+
+def bench_koumoku_tree(repeat=200):
+    from utils_cls_parse import (construct_category_tree,
+                                 construct_lexicon_index)
+
+    tree = construct_category_tree("./data_cls/KOUMOKU.txt")
+    cls_map = tree.to_cls_map()
+    codes = [e.code for e in construct_lexicon_index(
+        "./data_cls/SAKUIN.txt").entries]
+    sections = [c for c in tree.codes if tree.depth[tree.by_code[c]] == 2]
+    items = [c for c in tree.codes if tree.depth[tree.by_code[c]] >= 3]
+
+    def timed(fn):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            out = fn()
+        return (time.perf_counter() - t0) / repeat, out
+
+    # 1. SAKUIN 每一行的分类番号 → L1
+    t_dict, via_dict = timed(lambda: [cls_map[c][1] if c in cls_map else None
+                                      for c in codes])
+    t_tree, via_tree = timed(lambda: [tree.section(c) for c in codes])
+    print(f"L1 of {len(codes)} SAKUIN codes: dict={t_dict * 1000:7.2f}ms "
+          f"({sum(x is not None for x in via_dict)} hits) "
+          f"interval table={t_tree * 1000:7.2f}ms "
+          f"({sum(x is not None for x in via_tree)} hits)")
+
+    # 2. 每个部門下的全部编号
+    def scan_all():
+        return [[k for k in cls_map if k != s and k.startswith(s)]
+                for s in sections]
+    t_dict, via_dict = timed(scan_all)
+    t_tree, via_tree = timed(lambda: [tree.descendants(s) for s in sections])
+    assert [sorted(x) for x in via_dict] == [sorted(x) for x in via_tree]
+    print(f"descendants of {len(sections)} sections: "
+          f"dict scan={t_dict * 1000:7.2f}ms tree={t_tree * 1000:7.2f}ms "
+          f"({t_dict / t_tree:6.1f}x)")
+
+    # 3. 每个分类项目的祖先链
+    def prefix_chain(code):
+        major, minor = code.split(".")
+        return [major] + [p for k in range(1, len(minor))
+                          if (p := f"{major}.{minor[:k]}") in cls_map]
+    t_dict, _ = timed(lambda: [prefix_chain(c) for c in items])
+    t_tree, _ = timed(lambda: [tree.ancestors(c) for c in items])
+    print(f"ancestors of {len(items)} items: prefix probing="
+          f"{t_dict * 1000:7.2f}ms tree={t_tree * 1000:7.2f}ms "
+          f"({t_dict / t_tree:6.1f}x)")
+
+
+def _supply_cls_loop(verbs, lexicon, dic2):
+    """旧版 SupplyCLS 的逐行查表"""
+    cls_ls, candidates_ls, meaning_ls = [], [], []
+    for v in verbs:
+        entries = lexicon.lookup(v)
+        if entries:
+            cls_ls.append(entries[-1].code)
+            candidates_ls.append("; ".join(
+                f"{code}({'/'.join(dic2.get(code, ['NotFound'] * 3))})"
+                for code in lexicon.codes(v)))
+        else:
+            cls_ls.append("Not Found.")
+            candidates_ls.append("Not Found.")
+    for cls in cls_ls:
+        meaning_ls.append(dic2.get(cls, ["NotFound", "NotFound", "NotFound"]))
+    return cls_ls, candidates_ls, meaning_ls
+
+
+def bench_supply_cls(rows=1_000_000):
+    import random
+
+    import pandas as pd
+
+    from dictionary_with_class import (CORPORA, annotate_verb_classes,
+                                       export_candidates_name,
+                                       export_key_name)
+    from utils_cls_parse import load_cls_map_dict, load_lexicon_index
+
+    lexicon = load_lexicon_index("./data_cls/SAKUIN.txt")
+    dic2 = load_cls_map_dict("./data_cls/KOUMOKU.txt")
+    # 按三份语料里前项动词的实际分布抽样，拼出 rows 行的合成语料
+    verbs = []
+    for path, sheet in CORPORA:
+        verbs += pd.read_excel(path, sheet_name=sheet)[
+            "所使用的前项动词"].dropna().astype(str).tolist()
+    rng = random.Random(0)
+    df = pd.DataFrame({"所使用的前项动词": rng.choices(verbs, k=rows)})
+    print(f"{rows} rows, {df['所使用的前项动词'].nunique()} distinct verbs")
+
+    t0 = time.perf_counter()
+    cls_ls, candidates_ls, meaning_ls = _supply_cls_loop(
+        df["所使用的前项动词"].tolist(), lexicon, dic2)
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    out = annotate_verb_classes(df, lexicon, dic2)
+    t_join = time.perf_counter() - t0
+
+    assert out[export_key_name].tolist() == cls_ls
+    assert out[export_candidates_name].tolist() == candidates_ls
+    assert out["Meaning"].tolist() == [m[0] for m in meaning_ls]
+    print(f"per-row loop={t_loop:6.2f}s  join={t_join:6.2f}s "
+          f"({t_loop / t_join:5.1f}x)")
+
+
+def bench_lemma_fallback(repeat=200):
+    import pandas as pd
+
+    from dictionary_with_class import CORPORA, VERB_CLASSES
+    from utils_cls_parse import construct_normalization_index
+
+    t0 = time.perf_counter()
+    normalizer = construct_normalization_index("./data_cls/SAKUIN.txt")
+    print(f"build: {time.perf_counter() - t0:.2f}s, "
+          f"{len(normalizer.readings)} kanji runs with learned readings")
+
+    for path, sheet in CORPORA:
+        verbs = pd.read_excel(path, sheet_name=sheet)[
+            "所使用的前项动词"].dropna().astype(str).unique()
+        normalizer.tier_counts.clear()
+        for v in verbs:
+            normalizer.resolve(v, VERB_CLASSES)
+        print(f"{sheet:<10} {len(verbs):>4} verbs: {normalizer.report()}")
+
+    # 单次查找的耗费：按最终命中的层分组计时
+    by_tier = {}
+    for path, sheet in CORPORA:
+        for v in pd.read_excel(path, sheet_name=sheet)[
+                "所使用的前项动词"].dropna().astype(str).unique():
+            by_tier.setdefault(normalizer.resolve(v, VERB_CLASSES)[0], []).append(v)
+    for tier, verbs in by_tier.items():
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for v in verbs:
+                normalizer.resolve(v, VERB_CLASSES)
+        per = (time.perf_counter() - t0) / (repeat * len(verbs))
+        print(f"{tier or 'miss':<10} {len(verbs):>4} verbs {per * 1e6:7.1f}us/lookup")
+
+
+def _dict_common_prefixes(keys, max_len, text, start):
+    """朴素做法：把 text[start:start+1..max_len] 逐个拿去查 dict"""
+    found = []
+    for end in range(start + 1, min(len(text), start + max_len) + 1):
+        key_id = keys.get(text[start:end])
+        if key_id is not None:
+            found.append((end, key_id))
+    return found
+
+
+def bench_lexicon_trie(repeat=3):
+    import sys
+
+    import pandas as pd
+
+    from dictionary_with_class import CORPORA
+    from lexicon_trie import DoubleArrayTrie
+    from utils_cls_parse import construct_lexicon_index
+
+    lexicon = construct_lexicon_index("./data_cls/SAKUIN.txt")
+    words = sorted({w for e in lexicon.entries for w in (e.reading, e.headword) if w})
+    t0 = time.perf_counter()
+    trie = DoubleArrayTrie(words)
+    t_build = time.perf_counter() - t0
+    keys = {w: i for i, w in enumerate(words)}
+    max_len = max(map(len, words))
+    dict_bytes = sys.getsizeof(keys) + sum(sys.getsizeof(w) for w in words)
+    print(f"{len(words)} keys (max length {max_len}), trie build {t_build:.2f}s")
+    print(f"memory: dict {dict_bytes / 2 ** 20:6.2f} MiB  "
+          f"double-array {trie.nbytes() / 2 ** 20:6.2f} MiB")
+
+    text = "".join(
+        t for path, sheet in CORPORA
+        for t in pd.read_excel(path, sheet_name=sheet)["合并内容"].dropna().astype(str))
+    positions = range(len(text))
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = [fn(i) for i in positions]
+            best = min(best, time.perf_counter() - t0)
+        return best, out
+
+    t_dict, via_dict = timed(lambda i: _dict_common_prefixes(keys, max_len, text, i))
+    t_trie, via_trie = timed(lambda i: trie.common_prefixes(text, i))
+    assert via_dict == via_trie
+    n_matches = sum(map(len, via_trie))
+    print(f"common prefixes over {len(text)} chars ({n_matches} matches): "
+          f"dict={len(text) / t_dict / 1e3:7.1f}k pos/s  "
+          f"trie={len(text) / t_trie / 1e3:7.1f}k pos/s ({t_dict / t_trie:4.1f}x)")
+
+    t_dict, via_dict = timed(
+        lambda i: (_dict_common_prefixes(keys, max_len, text, i) or [None])[-1])
+    t_trie, via_trie = timed(lambda i: trie.longest_prefix(text, i))
+    assert via_dict == via_trie
+    print(f"longest prefix:  dict={len(text) / t_dict / 1e3:7.1f}k pos/s  "
+          f"trie={len(text) / t_trie / 1e3:7.1f}k pos/s ({t_dict / t_trie:4.1f}x)")
+
+
+def bench_komu_scan(sizes_mb=(20, 100), workers=None):
+    import tempfile
+    import tracemalloc
+
+    import pandas as pd
+
+    from compound_scanner import scan_corpus
+    from dictionary_with_class import CORPORA
+
+    lines = [t.replace("\n", " ") for path, sheet in CORPORA
+             for t in pd.read_excel(path, sheet_name=sheet)["合并内容"].dropna().astype(str)]
+    block = ("\n".join(lines) + "\n").encode("utf-8")
+    workers = workers or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mb in sizes_mb:
+            path = os.path.join(tmp, f"corpus-{mb}mb.txt")
+            with open(path, "wb") as f:
+                for _ in range(max(1, mb * (1 << 20) // len(block))):
+                    f.write(block)
+            size = os.path.getsize(path) / 2 ** 20
+            for w in sorted({1, workers}):
+                t0 = time.perf_counter()
+                n = sum(1 for _ in scan_corpus([path], workers=w))
+                elapsed = time.perf_counter() - t0
+                print(f"{size:6.1f} MiB workers={w}: {n} matches in {elapsed:6.2f}s "
+                      f"({size / elapsed:5.1f} MiB/s)")
+
+            # 内存单独跑一遍：tracemalloc 会拖慢计时
+            tracemalloc.start()
+            for _ in scan_corpus([path], workers=1):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{size:6.1f} MiB in-process scan: peak traced memory "
+                  f"{peak / 2 ** 20:6.1f} MiB")
+
+
+_SYNTHETIC_VOCAB = [
+    ("本", "名詞", "一般", "*", "*", "*", "本"),
+    ("世界", "名詞", "一般", "*", "*", "*", "世界"),
+    ("を", "助詞", "格助詞", "一般", "*", "*", "を"),
+    ("に", "助詞", "格助詞", "一般", "*", "*", "に"),
+    ("が", "助詞", "格助詞", "一般", "*", "*", "が"),
+    ("引きずり", "動詞", "自立", "*", "五段・ラ行", "連用形", "引きずる"),
+    ("こも", "動詞", "非自立", "*", "五段・マ行", "未然ウ接続", "こむ"),
+    ("読ん", "動詞", "自立", "*", "五段・マ行", "連用タ接続", "読む"),
+    ("だ", "助動詞", "*", "*", "特殊・タ", "基本形", "だ"),
+    ("。", "記号", "句点", "*", "*", "*", "。"),
+]
+
+
+def _synthetic_chasen(n_sentences, tokens_per_sentence=12, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    for _ in range(n_sentences):
+        lines = []
+        for surface, pos, sub1, sub2, ctype, cform, base in rng.choices(
+                _SYNTHETIC_VOCAB, k=tokens_per_sentence):
+            lines.append("\t".join([surface, "ヨミ", "ヨミ", pos, sub1, sub2,
+                                    "*", ctype, cform, base]))
+        yield lines
+
+
+def _parse_as_dicts(lines):
+    """旧的 7 键字典表示，作为对照。"""
+    parsed_data = []
+    for line in lines:
+        line = line.strip()
+        if not line or line == "EOS":
+            continue
+        parts = line.split("\t")
+        if len(parts) < 10:
+            continue
+        parsed_data.append({
+            "surface": parts[0], "base_form": parts[9], "pos": parts[3],
+            "pos_sub1": parts[4], "pos_sub2": parts[5],
+            "conjugation_type": parts[7], "conjugation_form": parts[8],
+        })
+    return parsed_data
+
+
+def bench_tokens(n=100_000):
+    import gc
+    import tracemalloc
+    from Mecab_Analysis import MeCabJapaneseAnalyzer
+
+    corpus = list(_synthetic_chasen(n))
+    analyzer = MeCabJapaneseAnalyzer()
+    for name, parse, get_pos in [
+        ("dict", _parse_as_dicts, lambda t: t["pos"]),
+        ("MeCabToken", analyzer._parse_chasen_lines, lambda t: t.pos),
+    ]:
+        gc.collect()
+        tracemalloc.start()
+        parsed = [parse(lines) for lines in corpus]
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del parsed
+        gc.collect()
+
+        t0 = time.perf_counter()
+        parsed = [parse(lines) for lines in corpus]
+        parse_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        n_verbs = sum(get_pos(t) == "動詞" for sent in parsed for t in sent)
+        scan_time = time.perf_counter() - t0
+        del parsed
+
+        print(f"{name:<11} {n} sentences: memory={memory / 2**20:7.1f}MiB "
+              f"parse={parse_time:5.2f}s scan={scan_time:5.2f}s "
+              f"(verbs={n_verbs})")
+
+
+def _case_particles_rescan(analyzer, parsed_data):
+    """旧实现：每个格助词都复制前缀并倒序扫描，且重新提取核心动词。"""
+    particle_analysis = []
+    main_verb = analyzer.extract_main_verb(parsed_data)
+    main_verb_base = main_verb.base_form if main_verb else "未识别核心动词"
+    for idx, word in enumerate(parsed_data):
+        if word.pos == "助詞" and word.pos_sub1 == "格助詞" \
+                and word.surface in analyzer.target_particles:
+            dependent_noun = None
+            if idx > 0:
+                for prev_word in reversed(parsed_data[:idx]):
+                    if prev_word.pos.startswith("名詞"):
+                        dependent_noun = prev_word.surface
+                        break
+            particle_analysis.append({
+                "particle": word.surface,
+                "direct_dependent": dependent_noun or "未识别名词",
+                "final_dependent_verb": main_verb_base,
+                "particle_function": analyzer._get_particle_function(
+                    word.surface, dependent_noun, main_verb_base),
+            })
+    return particle_analysis
+
+
+def bench_particles(lengths=(50, 500, 5000), repeat=20):
+    from Mecab_Analysis import MeCabJapaneseAnalyzer
+
+    analyzer = MeCabJapaneseAnalyzer()
+    for length in lengths:
+        # 把多个句子拼成一个长句，倒序扫描的代价随长度平方增长
+        lines = next(_synthetic_chasen(1, length, seed=length))
+        tokens = analyzer._parse_chasen_lines(lines)
+        main_verb = analyzer.extract_main_verb(tokens)
+        old = _case_particles_rescan(analyzer, tokens)
+        new = analyzer.analyze_case_particles(tokens, main_verb)
+        assert old == new
+
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            _case_particles_rescan(analyzer, tokens)
+        t_old = (time.perf_counter() - t0) / repeat
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            analyzer.analyze_case_particles(tokens, main_verb)
+        t_new = (time.perf_counter() - t0) / repeat
+        print(f"{length:>6} tokens: rescan={t_old * 1000:9.2f}ms "
+              f"single-pass={t_new * 1000:7.2f}ms ({t_old / t_new:6.1f}x)")
+
+
+def bench_dedup():
+    import pandas as pd
+    from API import group_duplicates
+
+    for path, sheet in CORPORA:
+        df = pd.read_excel(path, sheet_name=sheet)
+        df = df.dropna(subset=["合并内容", "所使用的前项动词"])
+        texts = df["合并内容"].tolist()
+        pairs = [f"待分析语句：{t}\n前项动词：{v}"
+                 for t, v in zip(texts, df["所使用的前项动词"])]
+        verbs = df["所使用的前项动词"].tolist()
+        for task, inputs in [("sentence", texts), ("sentence+verb", pairs),
+                             ("verb", verbs)]:
+            n, u = len(inputs), len(group_duplicates(inputs))
+            print(f"{sheet:<10} {task:<14} rows={n:<5} unique={u:<5} "
+                  f"saved={n - u:<5} ({(n - u) / n:6.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("target", choices=["client", "dispatch", "dedup", "load",
+                                           "mecab", "mecab-pool", "knp-pool",
+                                           "knp-features", "knp-stream",
+                                           "lexicon-load", "read-cjk",
+                                           "koumoku-tree", "supplycls",
+                                           "lemma-fallback", "lexicon-trie",
+                                           "komu-scan", "tokens", "particles"])
+    parser.add_argument("-n", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--knp-output",
+                        help="captured `knp -tab` output for knp-features "
+                             "and knp-stream")
+    args = parser.parse_args()
+
+    if args.target == "client":
+        bench_client(args.n)
+    elif args.target == "dispatch":
+        bench_dispatch(args.n)
+    elif args.target == "dedup":
+        bench_dedup()
+    elif args.target == "load":
+        bench_load(args.n, batch_size=args.batch_size)
+    elif args.target == "mecab":
+        bench_mecab(args.n)
+    elif args.target == "mecab-pool":
+        bench_mecab_pool()
+    elif args.target == "knp-pool":
+        bench_knp_pool(args.n)
+    elif args.target == "knp-features":
+        bench_knp_features(args.knp_output)
+    elif args.target == "knp-stream":
+        bench_knp_stream(args.knp_output)
+    elif args.target == "lexicon-load":
+        bench_lexicon_load()
+    elif args.target == "read-cjk":
+        bench_read_cjk()
+    elif args.target == "koumoku-tree":
+        bench_koumoku_tree()
+    elif args.target == "supplycls":
+        bench_supply_cls()
+    elif args.target == "lemma-fallback":
+        bench_lemma_fallback()
+    elif args.target == "lexicon-trie":
+        bench_lexicon_trie()
+    elif args.target == "komu-scan":
+        bench_komu_scan()
+    elif args.target == "tokens":
+        bench_tokens()
+    elif args.target == "particles":
+        bench_particles()
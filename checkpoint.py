@@ -0,0 +1,100 @@
+"""
+======================================================================
+CHECKPOINT ---
+
+Append-only JSONL journal so that long LLM runs can be resumed.
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import json
+import os
+from pathlib import Path
+
+
+CHECKPOINT_DIR = "./.cache/checkpoints"
+
+
+class CheckpointJournal:
+    """
+    每完成一个句子追加一行 {"idx": 行号, "input": 输入, "response": 原始回复}。
+    进程中途崩溃时最多丢失正在写的那一行；读取时跳过不完整的行。
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> dict[int, dict]:
+        done = {}
+        if not self.path.exists():
+            return done
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 崩溃时写了一半的行
+                done[record["idx"]] = record
+        return done
+
+    def reset(self):
+        self.path.unlink(missing_ok=True)
+
+    def append(self, idx: int, user_input: str, response: str):
+        record = {"idx": idx, "input": user_input, "response": response}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def is_json(response) -> bool:
+    try:
+        json.loads(response)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def run_with_checkpoint(inputs, call_many, name, resume=False, validate=None):
+    """
+    用 call_many(pending_inputs, on_result=...) 处理 inputs，并逐条写入 journal。
+
+    :param inputs: 全部输入（行号即 journal 中的 idx）
+    :param call_many: 形如 API.LLM_V_analysis_many 的批量函数
+    :param name: journal 文件名（不含扩展名），通常与导出的 Excel 同名
+    :param resume: True 时跳过 journal 中已完成且输入未变的行；否则清空重来
+    :param validate: 只有 validate(response) 为真的回复才记为已完成
+    :return: 与 inputs 一一对应的回复列表（失败的条目是 Exception）
+    """
+    journal = CheckpointJournal(Path(CHECKPOINT_DIR) / f"{name}.jsonl")
+    if resume:
+        done = journal.load()
+    else:
+        journal.reset()
+        done = {}
+
+    pending = [i for i, x in enumerate(inputs)
+               if i not in done or done[i]["input"] != x]
+    print(f"Checkpoint {name}: {len(inputs) - len(pending)} done, "
+          f"{len(pending)} pending.")
+
+    def on_result(j, response):
+        if validate is None or validate(response):
+            journal.append(pending[j], inputs[pending[j]], response)
+
+    results = [done[i]["response"] if i in done else None
+               for i in range(len(inputs))]
+    if pending:
+        new_results = call_many([inputs[i] for i in pending],
+                                on_result=on_result)
+        for i, response in zip(pending, new_results):
+            results[i] = response
+    return results
@@ -0,0 +1,332 @@
+"""
+======================================================================
+COMPOUND_SCANNER ---
+
+Stream raw corpus dumps (plain text or TSV, one sentence/record per line)
+and pull out V+こむ / V+込む compound verbs with their front verb.
+
+    python compound_scanner.py corpus.txt -o komu.tsv
+    python compound_scanner.py bccwj.tsv --text-column 3 --workers 8 -o komu.tsv
+
+Files are cut into byte ranges that are scanned by a process pool; results
+come back range by range in file order, so memory stays bounded by the
+range size no matter how large the corpus is.
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import argparse
+import csv
+import os
+import re
+import sys
+from collections import deque
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from utils_cls_parse import detect_encoding
+
+
+# 汉字（含 々 〆 和扩展 A 区）
+_KANJI = "々〆㐀-䶿一-鿿"
+# 連用形的词尾假名：五段（い段）与一段（い段 / え段），以及歴史的仮名遣いの ひ / へ（使ひ / 教へ）
+_RENYOU_ENDINGS = "いきぎしちにびみりじえけげせてねべめれひへ"
+
+# こむ / 込む 的活用：込ま(ない) 込み 込む 込め(ば) 込も(う) 込ん(だ)
+# 平假名こ必须紧跟連用形词尾；汉字込还允许省略送り仮名（担込み / 申込み）
+KOMU_PATTERN = re.compile(
+    rf"(?:(?<=[{_RENYOU_ENDINGS}])(?P<kana>こ)|(?<=[{_RENYOU_ENDINGS}{_KANJI}])込)"
+    r"(?:(?P<mizen>ま)(?=[なせれずぬ])|(?P<renyou>み)|(?P<shushi>む)"
+    r"|(?P<katei>め)(?=ば)|(?P<ishi>も)(?=う)|(?P<onbin>ん)(?=[だで]))")
+
+_FORMS = {
+    "mizen": "未然形",
+    "renyou": "連用形",
+    "shushi": "終止・連体形",
+    "katei": "仮定形",
+    "ishi": "意志形",
+    "onbin": "連用形（撥音便）",
+}
+
+_SENTENCE_END = re.compile(r"[。！？!?]")
+
+# 歴史的仮名遣い的連用形词尾 → 现代假名（词表是现代表记）
+_HISTORICAL = {"ひ": "い", "へ": "え"}
+# 連用形 → 终止形（五段）
+_GODAN = {"い": "う", "き": "く", "ぎ": "ぐ", "し": "す", "ち": "つ",
+          "に": "ぬ", "び": "ぶ", "み": "む", "り": "る"}
+
+
+def _is_kanji(ch: str) -> bool:
+    return "一" <= ch <= "鿿" or "㐀" <= ch <= "䶿" or ch in "々〆"
+
+
+def _is_hiragana(ch: str) -> bool:
+    return "ぁ" <= ch <= "ゖ"
+
+
+def front_verb_forms(front: str) -> List[str]:
+    """
+    前项（連用形）可能的终止形，常见的排前面：
+    押し → 押す，考え → 考える，落ち → 落つ / 落ちる，使ひ → 使う；
+    省略送り仮名的（担）给出所有五段词尾和 る，只能靠词表来定。
+    """
+    if front[-1] in _HISTORICAL:
+        front = front[:-1] + _HISTORICAL[front[-1]]
+    last = front[-1]
+    forms = []
+    if last in _GODAN:
+        forms.append(front[:-1] + _GODAN[last])
+    if last in _RENYOU_ENDINGS:
+        forms.append(front + "る")
+    if _is_kanji(last):
+        forms += [front + e for e in "るうくぐすつぶむ"]
+    return forms
+
+
+def _front_candidates(text: str, end: int) -> Tuple[List[str], List[str]]:
+    """
+    以 end 结尾的候选前项，各自由长到短：
+    (至多 3 个汉字 + 假名尾巴, 假名尾巴本身的后缀（至少 2 个字）)。
+    假名尾巴至多 4 个字，遇到不会出现在送り仮名里的を / は 就停；
+    へ 只有紧挨着こむ时才是送り仮名（教へ込む），否则当助词（国へのり込む）。
+    """
+    i = end
+    while (i > 0 and end - i < 4 and _is_hiragana(text[i - 1])
+           and text[i - 1] not in "をは" and (text[i - 1] != "へ" or i == end)):
+        i -= 1
+    j = i
+    while j > 0 and i - j < 3 and _is_kanji(text[j - 1]):
+        j -= 1
+    return [text[k:end] for k in range(j, i)], [text[k:end] for k in range(i, end - 1)]
+
+
+class KomuMatch(NamedTuple):
+    """一处 V+こむ：path / line_offset 定位到原文件的行（字节偏移），offset 是行内字符位置"""
+    path: str
+    line_offset: int
+    offset: int
+    surface: str        # 押し込ん
+    front: str          # 押し
+    front_verb: str     # 押す；定不下来时为空
+    verified: bool      # front_verb 是否在词表里查到（否则是按活用规则猜的）
+    form: str           # 込む 的活用形
+    sentence: str
+
+
+class KomuScanner:
+    """
+    在一行文本里找 V+こむ。
+
+    is_verb 给定时（如用 NormalizationIndex 判断是否为用の類词条），
+    候选前项由长到短逐个还原成终止形，第一个被认可的即为前项动词；
+    都不认可（或没给 is_verb）时取「1 个汉字 + 假名尾巴」作前项，没有汉字时取最长的假名尾巴
+    （国へのり込む → のり），按 front_verb_forms 的第一个猜终止形（省略送り仮名的猜不了，留空）。
+    连候选都没有的不是复合动词（平假名こ多半是 ここ / この 之类），直接丢掉。
+    """
+
+    def __init__(self, is_verb: Optional[Callable[[str], bool]] = None):
+        self.is_verb = is_verb
+
+    def _pick_front(self, text: str, end: int) -> Tuple[str, str, bool]:
+        anchored, kana_only = _front_candidates(text, end)
+        if self.is_verb is not None:
+            for front in anchored + kana_only:
+                for form in front_verb_forms(front):
+                    if self.is_verb(form):
+                        return front, form, True
+        if anchored:
+            front = anchored[-1]
+        elif kana_only:
+            front = kana_only[0]
+        else:
+            return "", "", False
+        if _is_kanji(front[-1]):
+            return front, "", False
+        return front, front_verb_forms(front)[0], False
+
+    def find(self, text: str) -> List[Tuple[int, str, str, str, bool, str, str]]:
+        """[(offset, surface, front, front_verb, verified, form, sentence), ...]"""
+        found = []
+        for m in KOMU_PATTERN.finditer(text):
+            front, verb, verified = self._pick_front(text, m.start())
+            if not front:
+                continue
+            start = m.start() - len(front)
+            head = text.rfind("。", 0, start)
+            for ch in "！？!?":
+                head = max(head, text.rfind(ch, 0, start))
+            tail = _SENTENCE_END.search(text, m.end())
+            sentence = text[head + 1:tail.end() if tail else len(text)]
+            found.append((start, text[start:m.end()], front, verb, verified,
+                          _FORMS[m.lastgroup], sentence.strip()))
+        return found
+
+
+# ------------------- 按字节区间流式读取 -------------------
+def _byte_ranges(path: str | Path, shard_bytes: int) -> List[Tuple[int, int]]:
+    size = os.path.getsize(path)
+    return [(start, min(start + shard_bytes, size))
+            for start in range(0, size, shard_bytes)] or [(0, 0)]
+
+
+def _iter_range_lines(path: str | Path, start: int, end: int,
+                      chunk_size: int = 1 << 20) -> Iterator[Tuple[int, bytes]]:
+    """
+    给出起点落在 [start, end) 内的每一行：(行首字节偏移, 行内容)。
+    按 chunk_size 分块读；相邻区间各自跳过 / 读完跨界的那一行，不重不漏。
+    """
+    with open(path, "rb") as f:
+        pos = start
+        if start:
+            f.seek(start - 1)
+            pos = start - 1 + len(f.readline())   # 前一个区间负责的行
+        f.seek(pos)
+        buf = b""
+        while pos < end:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            lines = (buf + chunk).split(b"\n")
+            buf = lines.pop()
+            for line in lines:
+                if pos >= end:
+                    return
+                yield pos, line
+                pos += len(line) + 1
+        if buf and pos < end:
+            yield pos, buf
+
+
+def scan_range(path: str | Path, start: int, end: int,
+               scanner: KomuScanner,
+               encoding: str = "utf-8",
+               text_column: Optional[int] = None) -> List[KomuMatch]:
+    """扫描文件的一个字节区间；text_column 给定时按 TSV 取该列（从 0 开始）"""
+    found = []
+    for line_offset, raw in _iter_range_lines(path, start, end):
+        line = raw.decode(encoding, errors="replace").rstrip("\r")
+        if text_column is not None:
+            cols = line.split("\t")
+            if text_column >= len(cols):
+                continue
+            line = cols[text_column]
+        for match in scanner.find(line):
+            found.append(KomuMatch(str(path), line_offset, *match))
+    return found
+
+
+def file_encoding(path: str | Path) -> str:
+    """按文件开头一段猜编码；按 \\n 切行，所以不接受 UTF-16/32"""
+    with open(path, "rb") as f:
+        sample = f.read(64 * 1024)
+    enc = detect_encoding(sample, complete=len(sample) < 64 * 1024) or "utf-8"
+    if enc.startswith(("utf-16", "utf-32")):
+        raise ValueError(f"{path}: {enc} 的文件请先转成 UTF-8 再扫描")
+    return enc
+
+
+# ------------------- 多进程分片 -------------------
+# 每个子进程持有自己的 KomuScanner（及其词表）
+_POOL_SCANNER: Optional[KomuScanner] = None
+
+
+def lexicon_verb_check(sakuin: str | Path = "./data_cls/SAKUIN.txt") -> Callable[[str], bool]:
+    """以 SAKUIN 的用の類词条（含表记揺れ回退）为准的 is_verb"""
+    from dictionary_with_class import VERB_CLASSES
+    from utils_cls_parse import load_normalization_index
+
+    normalizer = load_normalization_index(sakuin)
+    return lambda word: normalizer.resolve(word, VERB_CLASSES)[0] != ""
+
+
+def _init_pool_worker(sakuin: Optional[str]):
+    global _POOL_SCANNER
+    _POOL_SCANNER = KomuScanner(lexicon_verb_check(sakuin) if sakuin else None)
+
+
+def _scan_in_worker(task) -> List[KomuMatch]:
+    path, start, end, encoding, text_column = task
+    return scan_range(path, start, end, _POOL_SCANNER, encoding, text_column)
+
+
+def scan_corpus(paths: Iterable[str | Path],
+                workers: Optional[int] = None,
+                shard_bytes: int = 8 << 20,
+                text_column: Optional[int] = None,
+                encoding: Optional[str] = None,
+                sakuin: Optional[str | Path] = "./data_cls/SAKUIN.txt") -> Iterator[KomuMatch]:
+    """
+    逐个区间地产出语料中的 V+こむ，顺序与文件顺序一致
+    :param paths: 语料文件（纯文本或 TSV，一行一句 / 一条记录）
+    :param workers: 进程数，默认使用全部 CPU 核；1 表示在当前进程里顺序执行
+    :param shard_bytes: 每个任务扫描的字节数，决定了同时在内存里的结果量
+    :param text_column: TSV 的正文列（从 0 开始）；None 表示整行都是正文
+    :param encoding: 文件编码，默认逐个文件检测
+    :param sakuin: 判断前项动词用的 SAKUIN.txt；None 表示不查词表
+    """
+    def tasks():
+        for path in paths:
+            enc = encoding or file_encoding(path)
+            for start, end in _byte_ranges(path, shard_bytes):
+                yield str(path), start, end, enc, text_column
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        scanner = KomuScanner(lexicon_verb_check(sakuin) if sakuin else None)
+        for path, start, end, enc, column in tasks():
+            yield from scan_range(path, start, end, scanner, enc, column)
+        return
+
+    # 最多有 2 * workers 个区间在途，消费方慢时子进程也不会把结果越堆越多
+    with Pool(workers, initializer=_init_pool_worker,
+              initargs=(str(sakuin) if sakuin else None,)) as pool:
+        pending = deque()
+        for task in tasks():
+            pending.append(pool.apply_async(_scan_in_worker, (task,)))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def write_matches_tsv(matches: Iterable[KomuMatch], out) -> int:
+    """边扫边写，返回写出的条数"""
+    writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+    writer.writerow(KomuMatch._fields)
+    n = 0
+    for n, match in enumerate(matches, 1):
+        writer.writerow(match)
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract V+こむ compounds from raw corpora")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("-o", "--output", help="TSV output (default: stdout)")
+    parser.add_argument("--text-column", type=int, default=None,
+                        help="0-based TSV column holding the sentence")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-mb", type=float, default=8)
+    parser.add_argument("--encoding", default=None)
+    parser.add_argument("--no-lexicon", action="store_true",
+                        help="guess front verbs without checking SAKUIN")
+    args = parser.parse_args()
+
+    matches = scan_corpus(args.paths, workers=args.workers,
+                          shard_bytes=int(args.shard_mb * (1 << 20)),
+                          text_column=args.text_column, encoding=args.encoding,
+                          sakuin=None if args.no_lexicon else "./data_cls/SAKUIN.txt")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            n = write_matches_tsv(matches, f)
+        print(f"{n} matches -> {args.output}", file=sys.stderr)
+    else:
+        write_matches_tsv(matches, sys.stdout)
@@ -12,74 +12,133 @@ DICTIONARY_WITH_CLASS ---
 # ------------------------ Code --------------------------------------
 
 
-from utils_cls_parse import read_cjk_text,construct_a_dict, construct_cls_map_dict
+from utils_cls_parse import (LexiconIndex, NormalizationIndex, load_cls_map_dict,
+                             load_normalization_index)
 import pandas as pd
 
 
-def SupplyCLS():
-    df = pd.read_excel('./data_new/5-BCCWJ1313.xlsx', sheet_name='bccwj1313')
-    # df = pd.read_excel('./data_new/5-CHJ376.xlsx', sheet_name='chj376')
-    # df = pd.read_excel('./data_new/5-SHC508.xlsx', sheet_name='shc508')
+CORPORA = [
+    ('./data_new/5-BCCWJ1313.xlsx', 'bccwj1313'),
+    ('./data_new/5-CHJ376.xlsx', 'chj376'),
+    ('./data_new/5-SHC508.xlsx', 'shc508'),
+]
+
+export_key_name="前项动词在分类语义表中的类别"
+export_candidates_name="前项动词的全部候选类别"
+export_missing_name="前项动词未收录"
+export_match_name="前项动词匹配方式"
+meaning_columns=["Meaning", "Function", "XXXXXXX"]
+# 回退匹配只接受用の類（分类番号 2.xxxx），避免 座る → ざる(笊) 这类同音名词
+VERB_CLASSES=("2.",)
+
+
+def lexicon_tables(lexicon: LexiconIndex,
+                   dic2: dict[str, list[str]],
+                   headwords=None,
+                   aliases: pd.DataFrame | None=None):
+    """
+    把两个词表整理成 join 用的表（headwords 给定时只保留这些见出し）。
+    aliases 为回退匹配得到的额外 (headword, code) 行，headword 是语料中的原词：
+    primary    : 见出し → 主类别编号（与旧版 construct_a_dict 一致：取最后一个义项）
+    candidates : 见出し → 全部候选 "编号(L0/L1/见出し); ..."
+    meanings   : 编号 → Meaning / Function / XXXXXXX
+    """
+    entries=lexicon.to_frame()[["headword", "code"]]
+    if headwords is not None:
+        entries=entries[entries["headword"].isin(headwords)]
+    if aliases is not None:
+        entries=pd.concat([entries, aliases], ignore_index=True)
+    meanings=pd.DataFrame.from_dict(dic2, orient="index", columns=meaning_columns)
+
+    primary=entries.drop_duplicates("headword", keep="last").set_index("headword")["code"]
+
+    senses=entries.drop_duplicates().join(meanings, on="code")
+    filled=senses[meaning_columns].fillna("NotFound")
+    senses["label"]=(senses["code"] + "(" + filled["Meaning"] + "/"
+                     + filled["Function"] + "/" + filled["XXXXXXX"] + ")")
+    candidates=senses.groupby("headword", sort=False)["label"].agg("; ".join)
+    return primary, candidates, meanings
+
+
+def annotate_verb_classes(df: pd.DataFrame,
+                          lexicon: LexiconIndex,
+                          dic2: dict[str, list[str]],
+                          verb_col: str="所使用的前项动词",
+                          normalizer: NormalizationIndex | None=None) -> pd.DataFrame:
+    """
+    按 verb_col 给每一行补上分类语义表中的类别与含义（整列 join，不逐行查字典）。
+    给了 normalizer 时，见出し查不到的动词按其回退层（假名/送り仮名/読み）再找一次，
+    export_match_name 列记录命中的层。
+    仍未收录的动词：类别为 "Not Found."，含义为 "NotFound"，export_missing_name 列为 True。
+    """
+    verbs=df[verb_col].astype(str)
+    codes, uniques=pd.factorize(verbs)
+
+    aliases=None
+    if normalizer is None:
+        tiers=["exact" if v in lexicon else "" for v in uniques]
+    else:
+        resolved=[normalizer.resolve(v, VERB_CLASSES) for v in uniques]
+        tiers=[tier for tier, _ in resolved]
+        aliases=pd.DataFrame(
+            [(v, e.code) for v, (tier, entries) in zip(uniques, resolved)
+             if tier != "exact" for e in entries],
+            columns=["headword", "code"])
+
+    # 候选拼接只针对语料中出现过的动词，不为整本词表的几万个见出し做
+    primary, candidates, meanings=lexicon_tables(lexicon, dic2, uniques, aliases)
+
+    # 先在去重后的动词表（几百行）上 join，再按 factorize 的编号整列展开回语料
+    per_verb=pd.DataFrame({
+        export_key_name: primary.reindex(uniques).to_numpy(),
+        export_candidates_name: candidates.reindex(uniques).to_numpy(),
+    })
+    per_verb[export_missing_name]=per_verb[export_key_name].isna()
+    per_verb[export_match_name]=tiers
+    per_verb=per_verb.join(meanings, on=export_key_name)
+
+    per_verb[export_key_name]=per_verb[export_key_name].fillna("Not Found.")
+    per_verb[export_candidates_name]=per_verb[export_candidates_name].fillna("Not Found.")
+    per_verb[meaning_columns]=per_verb[meaning_columns].fillna("NotFound")
+
+    annotated=per_verb.take(codes).set_axis(df.index)
+    return pd.concat([df, annotated], axis=1)
 
-    text_list = df['合并内容'].dropna().tolist()
-    v_list=df["所使用的前项动词"].dropna().tolist()
-    # print(text_list[:20])
-    temp_ls=text_list[:]
-    v_ls=v_list[:]
-    print("Overall Length: ", len(temp_ls))
-    analysis_ls=[]
 
-    export_key_name="前项动词在分类语义表中的类别"
-    export_type_name2="前项动词含义"
+def SupplyCLS(corpora=CORPORA):
+    # 所有语料拼成一张表，一次 join 完成标注，再按语料分别导出
+    frames=[]
+    for path, sheet in corpora:
+        df = pd.read_excel(path, sheet_name=sheet)
+        df = df[['合并内容', "所使用的前项动词"]].dropna()
+        frames.append(df.assign(corpus=sheet))
+    df=pd.concat(frames, ignore_index=True)
+    print("Overall Length: ", len(df))
 
     # read the dict
-    dic=construct_a_dict("./data_cls/SAKUIN.txt")
-    dic2=construct_cls_map_dict("./data_cls/KOUMOKU.txt")
-    # dic={**dic1, **dic2}
-
-    # print(dic)
-    # assert "引き摺る" in dic
-    words_cannot_found=[]
-
-    cls_ls=[]
-    for v in v_ls:
-        if v in dic:
-            cls_ls.append(dic[v])
-        else:
-            print(f"Verb {v} Not Found.")
-            cls_ls.append("Not Found.")
-            words_cannot_found.append(v)
-
-    meaning_ls=[]
-    for cls in cls_ls:
-        if cls in dic2:
-            meaning_ls.append(dic2[cls])
-        else:
-            meaning_ls.append(["NotFound", "NotFound", "NotFound"])
-
-    v1_ls=[x[0] for x in meaning_ls]
-    v2_ls=[x[1] for x in meaning_ls]
-    v3_ls=[x[2] for x in meaning_ls]
-            
-    # Export to Excel.
-    print(len(temp_ls),len(v_ls),len(cls_ls),len(meaning_ls))
-    df = pd.DataFrame({
-        'Japanese': temp_ls,
-        '所使用的前项动词': v_ls,
-        export_key_name: cls_ls,
-        "Meaning": v1_ls,
-        "Function": v2_ls,
-        "XXXXXXX": v3_ls,
-    })
+    # 多值索引：一个词的所有义项都保留，不只是 construct_a_dict 留下的最后一个
+    # 两个词表都从预编译缓存载入，源文件改动时自动重建
+    # 归一化索引自带 LexiconIndex，见出し查不到时按表记揺れ回退，不必交给 LLM
+    normalizer=load_normalization_index("./data_cls/SAKUIN.txt")
+    dic2=load_cls_map_dict("./data_cls/KOUMOKU.txt")
 
-    # with open("WordsCannotFound.txt", "w", encoding='utf8') as f:
-    #     f.write("\n".join(list(set(words_cannot_found))))
+    annotated=annotate_verb_classes(df, normalizer.lexicon, dic2, normalizer=normalizer)
+    print(f"Verb lookup tiers: {normalizer.report()}")
+
+    words_cannot_found=annotated.loc[annotated[export_missing_name], "所使用的前项动词"].unique()
+    print(f"{len(words_cannot_found)} verbs Not Found: {list(words_cannot_found)}")
+
+    # Export to Excel.
+    for sheet, part in annotated.groupby("corpus", sort=False):
+        out=part.rename(columns={'合并内容': 'Japanese'})[
+            ['Japanese', '所使用的前项动词', export_key_name, export_candidates_name,
+             *meaning_columns, export_missing_name, export_match_name]]
+        out.to_excel(f'Verb-CLS-{len(out)}.xlsx', index=False)
+        print(f"{sheet}: {len(out)} rows, {out[export_missing_name].sum()} not found.")
 
-    df.to_excel(f'Verb-CLS-{len(temp_ls)}.xlsx', index=False) 
     print("Export DONE.")
-    return None
+    return annotated
 
 
 if __name__=="__main__":
     SupplyCLS()
-
@@ -12,23 +12,65 @@ KNP_ANALYSIS ---
 # ------------------------ Code --------------------------------------
 
 ## normal import 
+import itertools
 import json
-from typing import List,Tuple,Dict
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+from typing import List,Tuple,Dict,NamedTuple,Optional
 import random
 from pprint import pprint as ppp
 from pyknp import KNP
-import re
 
-def batch_extract_predicate_case(text_list, knp_instance=None):
+from parse_cache import ParseCache, get_parse_cache, tool_version
+
+_KNP_VERSIONS = {}
+
+def knp_version(knp):
+    """KNP 与 Juman++ 的版本及 KNP 选项，作为解析缓存 key 的一部分"""
+    key = (knp.command, tuple(knp.options))
+    if key not in _KNP_VERSIONS:
+        _KNP_VERSIONS[key] = "\n".join([
+            tool_version([knp.command, "-v"]),
+            tool_version([knp.juman.command, "-v"]),
+            " ".join(knp.options),
+        ])
+    return _KNP_VERSIONS[key]
+
+def parse_with_cache(knp, text, cache):
+    """
+    先查磁盘缓存，命中时直接从缓存的 KNP 原始输出重建 BList，
+    未命中再真正调用 knp.parse 并把原始输出写回缓存
+    """
+    if cache is None:
+        return knp.parse(text)
+    version = knp_version(knp)
+    raw = cache.get(text, "knp", version)
+    if raw is not None:
+        return knp.result(raw)
+    parse_result = knp.parse(text)
+    cache.put(text, "knp", version, parse_result.spec())
+    return parse_result
+
+def batch_extract_predicate_case(text_list, knp_instance=None, use_parse_cache=True,
+                                 formatted=True):
     """
     批量解析文本列表的用言格解析结果，返回格式化的字符串列表
     
     Args:
         text_list (list[str]): 待解析的日语文本列表
         knp_instance (KNP, optional): 已初始化的KNP实例（避免重复初始化提升效率）
+        use_parse_cache (bool): 是否复用 parse_cache 中已缓存的 KNP 解析结果
+        formatted (bool): False 时不经 _format_case_info，直接返回结构化的 case_info
     
     Returns:
-        list[str]: 每个文本对应的用言格解析结果字符串（无结果时返回空字符串）
+        list[str]: 每个文本对应的用言格解析结果字符串（无结果时返回空字符串）；
+            formatted=False 时为 list[list[dict]]（解析失败的句子仍为错误字符串）
     """
     # 初始化KNP解析器（若未传入）
     if knp_instance is None:
@@ -36,33 +78,302 @@ def batch_extract_predicate_case(text_list, knp_instance=None):
     else:
         knp = knp_instance
     
+    cache = get_parse_cache() if use_parse_cache else None
+
     # 存储最终结果的字符串列表
     result_str_list = []
     
     # 遍历每个文本进行解析
     for text in text_list:
-        # 空文本直接返回空字符串
-        if not text.strip():
-            result_str_list.append("")
-            continue
+        result_str_list.append(_extract_case(knp, text, cache, formatted))
+    
+    return result_str_list
+
+def _extract_case(knp, text, cache, formatted=True):
+    """单个文本：KNP解析 → 提取用言格信息 →（可选）格式化；串行与并行版本共用"""
+    # 空文本直接返回空字符串
+    if not text.strip():
+        return "" if formatted else []
+    
+    try:
+        # 执行KNP解析（包含格关系分析）
+        parse_result = parse_with_cache(knp, text, cache)
         
-        try:
-            # 执行KNP解析（包含格关系分析）
-            parse_result = knp.parse(text)
-            
-            # 提取当前文本的用言格解析结果（结构化数据）
-            case_info = _extract_single_text_case(parse_result)
-            
-            # 将结构化结果格式化为可读字符串
-            case_str = _format_case_info(case_info)
-            result_str_list.append(case_str)
+        # 提取当前文本的用言格解析结果（结构化数据）
+        case_info = _extract_single_text_case(parse_result)
         
-        except Exception as e:
-            # 解析失败时返回错误提示（避免批量中断）
-            error_str = f"解析失败：{str(e)}"
-            result_str_list.append(error_str)
+        # 将结构化结果格式化为可读字符串
+        return _format_case_info(case_info) if formatted else case_info
     
-    return result_str_list
+    except Exception as e:
+        # 解析失败时返回错误提示（避免批量中断）
+        return f"解析失败：{str(e)}"
+
+# ------------------- 多进程 KNP 池 -------------------
+def _knp_worker_main(conn, use_parse_cache):
+    """
+    子进程入口：持有自己的 KNP（及其 Juman++），循环处理 (idx, text)，
+    收到 None 时退出
+    """
+    # 自成进程组，超时被杀时 knp / jumanpp 子进程一并结束
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    knp = KNP()
+    # 不复用父进程 fork 过来的 sqlite 连接
+    cache = ParseCache() if use_parse_cache else None
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        idx, text, formatted = msg
+        conn.send((idx, _extract_case(knp, text, cache, formatted)))
+
+class _KNPWorker:
+    """父进程一侧的句柄：子进程、管道，以及正在处理的句子与截止时间"""
+
+    def __init__(self, use_parse_cache):
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=_knp_worker_main,
+                               args=(child_conn, use_parse_cache), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.idx = None
+        self.deadline = None
+
+    def submit(self, idx, text, formatted, timeout):
+        self.conn.send((idx, text, formatted))
+        self.idx = idx
+        self.deadline = time.monotonic() + timeout
+
+    def kill(self):
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, 9)
+            except OSError:
+                pass
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+class KNPWorkerPool:
+    """
+    N 个常驻子进程，每个子进程各自持有一个 KNP 实例。
+    句子逐条派发给空闲进程，结果按输入顺序返回；
+    某个句子超过 timeout 秒未返回时杀掉该进程（连同 knp/jumanpp）并重新拉起，
+    该句记为「解析失败：timeout」，其余句子不受影响。
+    """
+
+    def __init__(self, workers=None, timeout=60.0, use_parse_cache=True):
+        self.n_workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.use_parse_cache = use_parse_cache
+        self.restarts = 0
+        self._workers = [_KNPWorker(use_parse_cache)
+                         for _ in range(self.n_workers)]
+
+    def _respawn(self, worker):
+        worker.kill()
+        self.restarts += 1
+        new = _KNPWorker(self.use_parse_cache)
+        self._workers[self._workers.index(worker)] = new
+        return new
+
+    def map(self, text_list, formatted=True):
+        """与 batch_extract_predicate_case 相同的输出，顺序与输入一致"""
+        results = [("" if formatted else []) for _ in text_list]
+        pending = deque((i, t) for i, t in enumerate(text_list) if t.strip())
+        idle = list(self._workers)
+        busy = {}  # conn -> worker
+
+        while pending or busy:
+            while idle and pending:
+                worker = idle.pop()
+                idx, text = pending.popleft()
+                worker.submit(idx, text, formatted, self.timeout)
+                busy[worker.conn] = worker
+
+            next_deadline = min(w.deadline for w in busy.values())
+            ready = wait(list(busy), max(0.0, next_deadline - time.monotonic()))
+            for conn in ready:
+                worker = busy.pop(conn)
+                try:
+                    idx, case_str = conn.recv()
+                    results[idx] = case_str
+                    idle.append(worker)
+                except (EOFError, OSError):
+                    # 子进程意外退出（如 KNP 段错误）
+                    results[worker.idx] = "解析失败：KNP 进程异常退出"
+                    idle.append(self._respawn(worker))
+
+            now = time.monotonic()
+            for conn, worker in list(busy.items()):
+                if worker.deadline <= now:
+                    del busy[conn]
+                    results[worker.idx] = f"解析失败：timeout（{self.timeout}s）"
+                    idle.append(self._respawn(worker))
+
+        return results
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def batch_extract_predicate_case_parallel(text_list, workers=None, timeout=60.0,
+                                          use_parse_cache=True, formatted=True):
+    """
+    batch_extract_predicate_case 的多进程版本，每个进程一个 KNP 实例
+    
+    Args:
+        text_list (list[str]): 待解析的日语文本列表
+        workers (int, optional): 进程数，默认使用全部 CPU 核
+        timeout (float): 单个句子的最长解析时间（秒），超时的进程会被杀掉重启
+        use_parse_cache (bool): 是否复用 parse_cache 中已缓存的 KNP 解析结果
+        formatted (bool): 同 batch_extract_predicate_case
+    
+    Returns:
+        list[str]: 与 batch_extract_predicate_case 相同，顺序与输入一致
+    """
+    with KNPWorkerPool(workers, timeout, use_parse_cache) as pool:
+        return pool.map(text_list, formatted)
+
+# ------------------- 结构化（列式）输出 -------------------
+class CaseRecord(NamedTuple):
+    """一行 = 一个句子中某个用言的一个格槽；无格槽的用言占一行，格相关列为 None"""
+    sentence_id: int
+    predicate: Optional[str]
+    basic_phrase: Optional[str]
+    case_marker: Optional[str]
+    case_element: Optional[str]
+    error: Optional[str] = None
+
+def case_info_to_records(sentence_id, case_info):
+    """把单个句子的 case_info（或解析失败时的错误字符串）展开成 CaseRecord"""
+    if isinstance(case_info, str):
+        yield CaseRecord(sentence_id, None, None, None, None, case_info)
+        return
+    for item in case_info:
+        predicate, phrase = item["用言原形"], item["用言基本句"]
+        if not item["格关系列表"]:
+            yield CaseRecord(sentence_id, predicate, phrase, None, None)
+        for rel in item["格关系列表"]:
+            yield CaseRecord(sentence_id, predicate, phrase,
+                             rel["格標識"], rel["格要素"])
+
+def iter_case_records(text_list, knp_instance=None, use_parse_cache=True):
+    """
+    逐句解析并惰性产出 CaseRecord，sentence_id 为句子在 text_list 中的下标
+    （并行时可对 batch_extract_predicate_case_parallel(formatted=False)
+    的结果逐句调用 case_info_to_records）
+    """
+    knp = knp_instance or KNP()
+    cache = get_parse_cache() if use_parse_cache else None
+    for sentence_id, text in enumerate(text_list):
+        yield from case_info_to_records(
+            sentence_id, _extract_case(knp, text, cache, formatted=False))
+
+def _case_record_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("sentence_id", pa.int64()),
+        ("predicate", pa.string()),
+        ("basic_phrase", pa.string()),
+        ("case_marker", pa.string()),
+        ("case_element", pa.string()),
+        ("error", pa.string()),
+    ])
+
+def _iter_record_batches(records, batch_size):
+    import pyarrow as pa
+
+    schema = _case_record_schema()
+
+    def to_batch(chunk):
+        columns = zip(*chunk)  # 行 → 列
+        return pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type)
+             for col, field in zip(columns, schema)], schema=schema)
+
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= batch_size:
+            yield to_batch(chunk)
+            chunk = []
+    if chunk:
+        yield to_batch(chunk)
+
+def case_records_to_table(records, batch_size=10000):
+    """CaseRecord 序列 → pyarrow.Table（.to_pandas() 后即可 groupby 统计格框架）"""
+    import pyarrow as pa
+
+    return pa.Table.from_batches(_iter_record_batches(records, batch_size),
+                                 schema=_case_record_schema())
+
+def write_case_records_parquet(records, path, batch_size=10000):
+    """
+    把 CaseRecord 流按 batch_size 行一组写入 Parquet，内存中最多保留一组
+    
+    Returns:
+        int: 写入的行数
+    """
+    import pyarrow.parquet as pq
+
+    n_rows = 0
+    with pq.ParquetWriter(path, _case_record_schema()) as writer:
+        for batch in _iter_record_batches(records, batch_size):
+            writer.write_batch(batch)
+            n_rows += batch.num_rows
+    return n_rows
+
+_PREDICATE_TYPES = frozenset(["動", "形", "形動"])
+_PREDICATE_HINSI = frozenset(["動詞", "形容詞", "形容動詞"])
+
+def parse_features(fstring):
+    """
+    把 KNP 素性字符串 "<名><名:値>..." 一次性切成字典：{"用言": "動", "文末": "", ...}
+    値 中可以再含 ":"（如 格解析結果、格関係0:ガ:私），只按第一个 ":" 切分；
+    同名素性出现多次时保留第一个（与 re.findall(...)[0] 一致）
+    """
+    features = {}
+    for item in reversed(fstring.strip()[1:-1].split("><")):
+        name, _, value = item.partition(":")
+        features[name] = value
+    return features
+
+def parse_case_frame(value):
+    """
+    格解析結果 的值 → [(格標識, 格要素), ...]，格要素为 "-" 时记为 "無"
+    切分规则与原先的 re.findall 版本逐字一致：按 ";" 拆格，每段再按 ":" 切，
+    至少 5 段时取第 3 段 "/" 前的部分为格標識、第 5 段为格要素
+    """
+    relations = []
+    # 拆分格关系（分号分隔多个格）
+    for part in value.split(";"):
+        fields = part.split(":")
+        if len(fields) >= 5:
+            case_element = fields[4]
+            relations.append((fields[2].split("/")[0],
+                              case_element if case_element != "-" else "無"))
+    return relations
 
 def _extract_single_text_case(parse_result):
     """
@@ -78,37 +389,33 @@ def _extract_single_text_case(parse_result):
     
     # 遍历所有基本句（Tag）定位用言
     for tag in parse_result.tag_list():
-        tag_fstring = tag.fstring
+        # 大多数基本句不是用言，先用一次子串查找跳过，不必切分素性
+        if "<用言:" not in tag.fstring:
+            continue
+        # 素性字符串只切一次，用言判定与格解析结果都查这个字典
+        features = parse_features(tag.fstring)
         
         # 筛选用言基本句（动词/形容词/形容动词）
-        if any(marker in tag_fstring for marker in ["<用言:動>", "<用言:形>", "<用言:形動>"]):
+        if features.get("用言") in _PREDICATE_TYPES:
             # 提取用言原形
+            mrph_list = tag.mrph_list()
             predicate_genkei = None
-            for mrph in tag.mrph_list():
-                if mrph.hinsi in ["動詞", "形容詞", "形容動詞"]:
+            for mrph in mrph_list:
+                if mrph.hinsi in _PREDICATE_HINSI:
                     predicate_genkei = mrph.genkei
                     break
             
-            # 提取格解析结果
-            case_matches = re.findall(r"<格解析結果:(.*?)>", tag_fstring)
-            case_relations = []
-            
-            if case_matches:
-                # 拆分格关系（分号分隔多个格）
-                for part in case_matches[0].split(";"):
-                    fields = part.split(":")
-                    if len(fields) >= 5:
-                        case_mark = fields[2].split("/")[0]  # 格標識（ガ/ヲ/ニ等）
-                        case_element = fields[4]             # 格要素（关联名词）
-                        case_relations.append({
-                            "格標識": case_mark,
-                            "格要素": case_element if case_element != "-" else "無"
-                        })
+            # 提取格解析结果（格標識：ガ/ヲ/ニ等，格要素：关联名词）
+            case_relations = [
+                {"格標識": case_mark, "格要素": case_element}
+                for case_mark, case_element
+                in parse_case_frame(features.get("格解析結果", ""))
+            ]
             
             # 收集当前用言信息
             case_results.append({
                 "用言原形": predicate_genkei or "不明",
-                "用言基本句": "".join([mrph.midasi for mrph in tag.mrph_list()]),
+                "用言基本句": "".join([mrph.midasi for mrph in mrph_list]),
                 "格关系列表": case_relations
             })
     
@@ -140,6 +447,115 @@ def _format_case_info(case_info):
     
     return "\n".join(parts)
 
+# ------------------- 直接读取 KNP 原始输出（不构建 pyknp 对象） -------------------
+def _flush_raw_tag(sentence_id, fstring, mrphs):
+    """一个基本句读完后：若为用言则产出其 CaseRecord（与 _extract_single_text_case 同一套规则）"""
+    if "<用言:" not in fstring:
+        return
+    features = parse_features(fstring)
+    if features.get("用言") not in _PREDICATE_TYPES:
+        return
+    predicate_genkei = next((genkei for _, genkei, hinsi in mrphs
+                             if hinsi in _PREDICATE_HINSI), None)
+    item = {
+        "用言原形": predicate_genkei or "不明",
+        "用言基本句": "".join(midasi for midasi, _, _ in mrphs),
+        "格关系列表": [{"格標識": case_mark, "格要素": case_element}
+                    for case_mark, case_element
+                    in parse_case_frame(features.get("格解析結果", ""))],
+    }
+    yield from case_info_to_records(sentence_id, [item])
+
+def iter_knp_case_records(lines, sentence_ids=None):
+    """
+    逐行读取 `knp -tab` 的原始输出（文件对象或任意行迭代器），惰性产出 CaseRecord。
+    同一时刻只保留当前基本句的形态素，内存占用与语料大小无关。
+    
+    Args:
+        lines (Iterable[str]): KNP 输出行（"#" 注释 / "*" 文節 / "+" 基本句 / 形态素 / "EOS"）
+        sentence_ids (Iterable[int], optional): 依次分配给每个句子的 id，默认 0, 1, 2, ...
+    
+    Yields:
+        CaseRecord: 与 iter_case_records 相同的记录
+    """
+    ids = iter(sentence_ids) if sentence_ids is not None else itertools.count()
+    sentence_id = None
+    fstring, mrphs = "", []
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line or line.startswith(";;"):
+            continue  # 空行 / KNP 的错误信息
+        if sentence_id is None:
+            sentence_id = next(ids)
+        head = line[0]
+        if line == "EOS":
+            yield from _flush_raw_tag(sentence_id, fstring, mrphs)
+            sentence_id = None
+            fstring, mrphs = "", []
+        elif head == "#" or head == "*":
+            continue
+        elif head == "+":
+            yield from _flush_raw_tag(sentence_id, fstring, mrphs)
+            start = line.find("<")
+            fstring, mrphs = (line[start:] if start >= 0 else ""), []
+        else:
+            # 见出し 読み 原形 品詞 ...；"\ " 是转义的半角空格
+            fields = line.replace("\\ ", "\0").split(" ", 4)
+            if len(fields) >= 4:
+                mrphs.append((fields[0].replace("\0", " "),
+                              fields[2].replace("\0", " "), fields[3]))
+
+def knp_raw_lines(text_iter, knp_command="knp", jumanpp_command="jumanpp"):
+    """
+    以 `jumanpp | knp -tab` 管道逐句解析，逐行产出 KNP 原始输出。
+    写入在后台线程进行，管道缓冲区满时自然阻塞，因此不会把整个语料读进内存。
+    """
+    juman = subprocess.Popen([jumanpp_command], stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, encoding="utf-8")
+    knp = subprocess.Popen([knp_command, "-tab"], stdin=juman.stdout,
+                           stdout=subprocess.PIPE, encoding="utf-8")
+    juman.stdout.close()  # 只让 knp 持有读端，jumanpp 退出后 knp 能读到 EOF
+
+    def feed():
+        try:
+            for text in text_iter:
+                juman.stdin.write(text + "\n")
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                juman.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        yield from knp.stdout
+    finally:
+        knp.stdout.close()
+        writer.join()
+        juman.wait()
+        knp.wait()
+
+def stream_case_records(text_iter, knp_command="knp", jumanpp_command="jumanpp"):
+    """
+    整个语料的流式版本：text_iter 可以是生成器（如逐行读取的大文件），
+    sentence_id 为句子在 text_iter 中的下标；空句不送入 KNP，也不产出记录
+    """
+    ids = queue.SimpleQueue()
+
+    def non_empty():
+        for sentence_id, text in enumerate(text_iter):
+            # 句中换行会被 jumanpp 当作句子边界
+            text = text.replace("\r", " ").replace("\n", " ").strip()
+            if text:
+                ids.put(sentence_id)
+                yield text
+
+    lines = knp_raw_lines(non_empty(), knp_command, jumanpp_command)
+    return iter_knp_case_records(lines, iter(ids.get, None))
+
 # ------------------- 示例调用 -------------------
 if __name__ == "__main__":
     # 测试文本列表
@@ -0,0 +1,240 @@
+"""
+======================================================================
+LEXICON_TRIE ---
+
+Double-array trie over SAKUIN headwords and readings, for longest-prefix
+matches and common-prefix enumeration inside running text.
+
+    trie = load_lexicon_trie()
+    trie.longest_match("引きずり込んだ")   # ("引き", (LexiconEntry(...),))
+    list(trie.matches("壁に押し込んだ"))   # [(0, "壁"), (1, "に"), (2, "押し"), ...]
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import sys
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from utils_cls_parse import (DEFAULT_COMPILED_DIR, LexiconEntry, LexiconIndex,
+                             construct_lexicon_index, load_compiled)
+
+
+class DoubleArrayTrie:
+    """
+    经典的 double-array：状态 s 经字符码 c 转移到 t = base[s] + c，当且仅当 check[t] == s。
+    字符码按出现频率从 1 开始编号；码 0 是词尾标记，其 base 存 -(词号 + 1)，
+    词号即该词在排好序的词表中的下标。
+
+    base / check 用 array('i') 存，整个结构只有两段连续内存加一个字符码表。
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        keys = sorted({k for k in keys if k})
+        self.size = len(keys)
+        freq = Counter(ch for k in keys for ch in k)
+        self._codes = {ch: i for i, (ch, _) in enumerate(freq.most_common(), 1)}
+
+        self._base = [0]
+        self._check = [0]       # 0 号是根，自己占着
+        self._next_check_pos = 1
+        self._build(keys)
+        # 去掉扩容多出的空位，末尾只留一个字符码的余量，查找时不必判断越界
+        used = max(i for i, s in enumerate(self._check) if s != -1) + 1
+        size = used + len(self._codes) + 1
+        self._reserve(size)
+        self._base = array("i", self._base[:size])
+        self._check = array("i", self._check[:size])
+
+    def _reserve(self, n: int):
+        if n > len(self._check):
+            grow = max(n, len(self._check) * 2) - len(self._check)
+            self._base.extend([0] * grow)
+            self._check.extend([-1] * grow)
+
+    def _find_base(self, codes: List[int]) -> int:
+        """找一个 base，使 base + c 对所有子节点码都是空位（darts 的做法）"""
+        check = self._check
+        first = codes[0]
+        pos = max(self._next_check_pos, first + 1)
+        start, nonzero, first_free = pos, 0, True
+        while True:
+            self._reserve(pos + 1)
+            if check[pos] != -1:
+                nonzero += 1
+                pos += 1
+                continue
+            if first_free:
+                self._next_check_pos = start = pos
+                first_free = False
+            base = pos - first
+            self._reserve(base + codes[-1] + 1)
+            if all(check[base + c] == -1 for c in codes):
+                break
+            pos += 1
+        # 扫过的区间几乎已填满时，下次从这里开始找
+        if nonzero / (pos - start + 1) >= 0.95:
+            self._next_check_pos = pos
+        return base
+
+    def _build(self, keys: List[str]):
+        codes = self._codes
+        stack = [(0, 0, 0, len(keys))]    # (状态, 深度, keys 区间)
+        while stack:
+            state, depth, lo, hi = stack.pop()
+            # 区间内的词前 depth 个字相同；排序后恰好以 depth 结尾的词排在最前
+            children = []
+            i = lo
+            while i < hi:
+                if len(keys[i]) == depth:
+                    children.append((0, i, i + 1))
+                    i += 1
+                    continue
+                ch = keys[i][depth]
+                j = i + 1
+                while j < hi and keys[j][depth] == ch:
+                    j += 1
+                children.append((codes[ch], i, j))
+                i = j
+            children.sort()
+            base = self._find_base([c for c, _, _ in children])
+            self._base[state] = base
+            for c, _, _ in children:
+                self._check[base + c] = state
+            for c, l, h in children:
+                if c == 0:
+                    self._base[base] = -l - 1
+                else:
+                    stack.append((base + c, depth + 1, l, h))
+
+    def common_prefixes(self, text: str, start: int = 0) -> List[Tuple[int, int]]:
+        """text[start:] 的所有前缀中属于词表的，返回 [(结束位置, 词号), ...]，由短到长"""
+        base, check, codes = self._base, self._check, self._codes
+        state = 0
+        found = []
+        for i in range(start, len(text)):
+            c = codes.get(text[i])
+            if c is None:
+                break
+            t = base[state] + c
+            if check[t] != state:
+                break
+            state = t
+            end = base[state]
+            if check[end] == state:
+                found.append((i + 1, -base[end] - 1))
+        return found
+
+    def longest_prefix(self, text: str, start: int = 0) -> Optional[Tuple[int, int]]:
+        """text[start:] 最长的、属于词表的前缀：(结束位置, 词号)；没有时为 None"""
+        base, check, codes = self._base, self._check, self._codes
+        state = 0
+        found = None
+        for i in range(start, len(text)):
+            c = codes.get(text[i])
+            if c is None:
+                break
+            t = base[state] + c
+            if check[t] != state:
+                break
+            state = t
+            end = base[state]
+            if check[end] == state:
+                found = (i + 1, -base[end] - 1)
+        return found
+
+    def index(self, key: str) -> int:
+        """key 的词号；不在词表中时为 -1"""
+        found = self.longest_prefix(key)
+        return found[1] if found is not None and found[0] == len(key) else -1
+
+    def __contains__(self, key: str) -> bool:
+        return bool(key) and self.index(key) >= 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def nbytes(self) -> int:
+        """base / check 两个数组加字符码表的大致内存占用"""
+        return (self._base.itemsize * len(self._base)
+                + self._check.itemsize * len(self._check)
+                + sys.getsizeof(self._codes))
+
+
+class LexiconTrie:
+    """
+    SAKUIN 的见出し与読み合在一棵 DoubleArrayTrie 里，匹配到的词再回 LexiconIndex 取义项
+    （见出し与読み相同的词条只算一次）。
+    """
+
+    def __init__(self, lexicon: LexiconIndex):
+        self.lexicon = lexicon
+        self.trie = DoubleArrayTrie(
+            e for row in zip(lexicon._columns[0], lexicon._columns[1]) for e in row)
+
+    def entries(self, key: str) -> Tuple[LexiconEntry, ...]:
+        """以 key 为见出し或読み的全部词条"""
+        by_headword = self.lexicon.lookup(key)
+        return by_headword + tuple(e for e in self.lexicon.lookup_reading(key)
+                                   if e.headword != key)
+
+    def longest_match(self, text: str,
+                      start: int = 0) -> Optional[Tuple[str, Tuple[LexiconEntry, ...]]]:
+        """从 start 开始最长的词表词：(词, 义项)；没有时为 None"""
+        found = self.trie.longest_prefix(text, start)
+        if found is None:
+            return None
+        key = text[start:found[0]]
+        return key, self.entries(key)
+
+    def prefixes(self, text: str, start: int = 0) -> List[str]:
+        """从 start 开始、属于词表的全部前缀，由短到长"""
+        return [text[start:end] for end, _ in self.trie.common_prefixes(text, start)]
+
+    def matches(self, text: str, longest: bool = False) -> Iterator[Tuple[int, str]]:
+        """
+        逐位置扫描 text，给出 (起点, 词)。
+        longest=False 时列出每个位置的所有前缀词；True 时每个位置只取最长的一个。
+        """
+        trie = self.trie
+        for i in range(len(text)):
+            if longest:
+                found = trie.longest_prefix(text, i)
+                if found is not None:
+                    yield i, text[i:found[0]]
+            else:
+                for end, _ in trie.common_prefixes(text, i):
+                    yield i, text[i:end]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.trie
+
+    def __len__(self) -> int:
+        return len(self.trie)
+
+
+def construct_lexicon_trie(fname: str | Path) -> LexiconTrie:
+    return LexiconTrie(construct_lexicon_index(fname))
+
+
+def load_lexicon_trie(fname: str | Path = "./data_cls/SAKUIN.txt",
+                      cache_dir: str | Path = DEFAULT_COMPILED_DIR) -> LexiconTrie:
+    """construct_lexicon_trie 的缓存版本，SAKUIN.txt 改动后自动重建"""
+    return load_compiled(fname, construct_lexicon_trie, cache_dir)
+
+
+if __name__ == "__main__":
+    # 经由真正的模块载入，缓存里的类才是 lexicon_trie.LexiconTrie 而不是 __main__.*
+    import lexicon_trie
+    trie = lexicon_trie.load_lexicon_trie()
+    print(f"{len(trie)} keys, {trie.trie.nbytes() / 2 ** 20:.2f} MiB")
+    for text in sys.argv[1:] or ["引きずり込んだ"]:
+        print(text, trie.longest_match(text), trie.prefixes(text))
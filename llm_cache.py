@@ -0,0 +1,187 @@
+"""
+======================================================================
+LLM_CACHE ---
+
+Content-addressed on-disk cache for LLM responses.
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import prompts
+
+
+DEFAULT_CACHE_PATH = "./.cache/llm_responses.sqlite"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def prompt_constants() -> dict[str, str]:
+    """prompts.py 中所有大写字符串常量：{常量名: 文本}"""
+    return {k: v for k, v in vars(prompts).items()
+            if k.isupper() and isinstance(v, str)}
+
+
+class LLMResponseCache:
+    """
+    SQLite 缓存，key = sha256(model, system prompt, user input, response_format)。
+
+    - 超过 max_entries 或 max_bytes 时按 last_access 做 LRU 淘汰；
+    - hits / misses 计数，便于确认重跑时确实命中；
+    - auto_invalidate=True 时，打开缓存会比对 prompts.py 中每个常量的哈希，
+      某个 prompt 改过之后，它名下的旧条目会被整体删除。
+    """
+
+    def __init__(self,
+                 path: str | Path = DEFAULT_CACHE_PATH,
+                 max_entries: int = 200_000,
+                 max_bytes: int = 512 * 1024 * 1024,
+                 auto_invalidate: bool = True):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._prompt_names = {v: k for k, v in prompt_constants().items()}
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                prompt_name TEXT,
+                response TEXT,
+                size INTEGER,
+                last_access REAL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access "
+            "ON responses(last_access)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS prompt_versions (
+                prompt_name TEXT PRIMARY KEY,
+                prompt_hash TEXT
+            )""")
+        self._conn.commit()
+
+        if auto_invalidate:
+            self.sync_prompt_versions()
+
+    @staticmethod
+    def make_key(model, prompt, user_input, response_format=None) -> str:
+        payload = json.dumps([model, prompt, user_input, response_format],
+                             ensure_ascii=False, sort_keys=True)
+        return _sha256(payload)
+
+    def prompt_name(self, prompt) -> str:
+        name = self._prompt_names.get(prompt)
+        if name is not None:
+            return name
+        # 拼接出来的 prompt（如批量模式的 TEXT_VV_V2_JAN + 后缀）归到最长的前缀常量
+        prefixes = [(len(text), n) for text, n in self._prompt_names.items()
+                    if prompt.startswith(text)]
+        return max(prefixes)[1] if prefixes else ""
+
+    def get(self, model, prompt, user_input, response_format=None):
+        key = self.make_key(model, prompt, user_input, response_format)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET last_access=? WHERE key=?",
+                (time.time(), key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, model, prompt, user_input, response_format, response):
+        key = self.make_key(model, prompt, user_input, response_format)
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, self.prompt_name(prompt), response, size, time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # 淘汰到上限的 90%，避免每次写入都触发淘汰
+        target_count = int(self.max_entries * 0.9)
+        target_bytes = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access")
+        doomed = []
+        for key, size in rows:
+            if count <= target_count and total <= target_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key=?", doomed)
+
+    def invalidate(self, prompt_name: str | None = None) -> int:
+        """删除某个 prompt 常量名下的条目；prompt_name 为 None 时清空全部。"""
+        with self._lock:
+            if prompt_name is None:
+                cur = self._conn.execute("DELETE FROM responses")
+            else:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE prompt_name=?",
+                    (prompt_name,))
+            self._conn.commit()
+        return cur.rowcount
+
+    def sync_prompt_versions(self) -> list[str]:
+        """比对 prompts.py 常量的哈希，删除已修改 prompt 的旧缓存，返回被失效的常量名。"""
+        stored = dict(self._conn.execute(
+            "SELECT prompt_name, prompt_hash FROM prompt_versions"))
+        changed = []
+        for name, text in prompt_constants().items():
+            h = _sha256(text)
+            if stored.get(name) == h:
+                continue
+            if name in stored:
+                changed.append(name)
+                self.invalidate(name)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompt_versions VALUES (?, ?)",
+                (name, h))
+        self._conn.commit()
+        if changed:
+            print(f"LLM cache: prompts changed, invalidated {changed}")
+        return changed
+
+    def stats(self) -> dict:
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": count, "bytes": total}
+
+    def close(self):
+        self._conn.close()
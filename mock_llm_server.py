@@ -0,0 +1,222 @@
+"""
+======================================================================
+MOCK_LLM_SERVER ---
+
+A local OpenAI-compatible stub for offline load tests.
+
+    python mock_llm_server.py --port 8765 --latency 0.5 --error-rate 0.05 --rpm 120
+    FOR_JAPAN_BASE_URL=http://127.0.0.1:8765/v1 FOR_JAPAN_API_KEY=sk-mock \
+        python Pre_V_AnalysisV2.py
+
+Only POST /v1/chat/completions is implemented. Replies are schema-valid
+JSON for the TEXT_VV_JAN / TEXT_VV_V2_JAN / TEXT_V_WITH_V prompts
+(including the batched form), and plain text for TEXT_TRANS.
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prompts import (TEXT_TRANS, TEXT_VV_JAN, TEXT_VV_V2_JAN,
+                     TEXT_V_WITH_V, TEXT_VV_BATCH_JAN, TEXT_VV_V2_BATCH_JAN)
+
+# system prompt → (版本, 是否批量)
+_V_PROMPTS = {
+    TEXT_VV_JAN: ("v1", False),
+    TEXT_VV_V2_JAN: ("v2", False),
+    TEXT_VV_BATCH_JAN: ("v1", True),
+    TEXT_VV_V2_BATCH_JAN: ("v2", True),
+}
+
+
+def _field(*keys):
+    return {k: "模拟结果" for k in keys}
+
+
+def fake_v_analysis(text, version):
+    """与 TEXT_VV_JAN(v1) / TEXT_VV_V2_JAN(v2) 的输出格式(B)一致的假结果。"""
+    if version == "v1":
+        return {
+            "前項動詞": _field("result", "reason"),
+            "語彙素": _field("result", "reason"),
+            "自他性判断": _field("result", "reason"),
+            "格助詞判断": _field("result", "reason"),
+        }
+    return {
+        "前項動詞": _field("result", "reason"),
+        "語彙素": _field("result", "reason"),
+        "自他性判断": _field("result1", "result2", "reason"),
+        "格助詞判断": _field("result", "description", "reason"),
+    }
+
+
+def fake_reply(system_prompt, user_input):
+    if system_prompt == TEXT_TRANS:
+        return f"（模拟译文）{user_input}"
+    if system_prompt == TEXT_V_WITH_V:
+        return json.dumps({
+            "自他性判断": _field("result", "reason"),
+            "格助词判断": _field("result", "reason"),
+        }, ensure_ascii=False)
+
+    if system_prompt not in _V_PROMPTS:
+        return "模拟回复"
+    version, batched = _V_PROMPTS[system_prompt]
+    if not batched:
+        return json.dumps(fake_v_analysis(user_input, version),
+                          ensure_ascii=False)
+    items = json.loads(user_input)
+    return json.dumps({"results": [
+        {"id": it["id"], **fake_v_analysis(it["text"], version)}
+        for it in items
+    ]}, ensure_ascii=False)
+
+
+class _RateLimiter:
+    """服务端的每分钟请求数限制，超限时返回 429 + Retry-After。"""
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.tokens = float(rpm or 0)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """成功返回 None，失败返回建议的等待秒数。"""
+        if not self.rpm:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            rate = self.rpm / 60.0
+            self.tokens = min(self.rpm, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / rate
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {"error": {"message": message,
+                                           "type": "mock_error"}}, headers)
+
+    def do_POST(self):
+        cfg = self.server.config
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_error(404, f"Unknown path {self.path}")
+
+        wait = self.server.limiter.try_acquire()
+        if wait is not None:
+            return self._send_error(429, "Rate limit reached",
+                                    {"Retry-After": f"{wait:.3f}"})
+
+        delay = cfg["latency"] + random.uniform(0, cfg["jitter"])
+        time.sleep(delay)
+        if random.random() < cfg["error_rate"]:
+            return self._send_error(500, "Mock internal error")
+
+        messages = request.get("messages", [])
+        system = next((m["content"] for m in messages
+                       if m["role"] == "system"), "")
+        user = next((m["content"] for m in messages
+                     if m["role"] == "user"), "")
+        content = fake_reply(system, user)
+        if random.random() < cfg["malformed_rate"]:
+            content = content[: len(content) // 2]
+
+        prompt_tokens = len(system) + len(user)
+        self._send_json(200, {
+            "id": f"mock-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content),
+                "total_tokens": prompt_tokens + len(content),
+            },
+        })
+
+    def log_message(self, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                error_rate=0.0, malformed_rate=0.0, rpm=None):
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    server.config = {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "malformed_rate": malformed_rate,
+    }
+    server.limiter = _RateLimiter(rpm)
+    return server
+
+
+def start_server(**kwargs):
+    """在后台线程启动服务，返回 (server, base_url)；用 server.shutdown() 停止。"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local OpenAI-compatible mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="base seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.2,
+                        help="extra uniform random seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="fraction of replies truncated into invalid JSON")
+    parser.add_argument("--rpm", type=int, default=None,
+                        help="requests per minute before answering 429")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.jitter,
+                         args.error_rate, args.malformed_rate, args.rpm)
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
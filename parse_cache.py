@@ -0,0 +1,170 @@
+"""
+======================================================================
+PARSE_CACHE ---
+
+Persistent cache of MeCab / KNP parses keyed by sentence text.
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import hashlib
+import sqlite3
+import subprocess
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import List, Optional
+
+
+DEFAULT_PARSE_CACHE_PATH = "./.cache/parses.sqlite"
+
+
+def tool_version(cmd: List[str]) -> str:
+    """运行 `mecab -D` / `knp -v` 之类的命令，把输出当作版本标识；失败时返回 "unknown"。"""
+    try:
+        out = subprocess.run(cmd, capture_output=True, encoding="utf-8",
+                             errors="ignore", timeout=30)
+        return (out.stdout + out.stderr).strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+class ParseCache:
+    """
+    SQLite 缓存，key = (sha256(句子), 分析器名, 词典/版本哈希)，
+    value 为 zlib 压缩后的序列化解析结果（由调用方决定格式）。
+    总大小超过 max_bytes 时按 last_access 淘汰最久未用的条目。
+    """
+
+    def __init__(self,
+                 path: str | Path = DEFAULT_PARSE_CACHE_PATH,
+                 max_bytes: int = 1024 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # 多进程同时写同一个库时靠 WAL + busy timeout 排队
+        self._conn = sqlite3.connect(self.path, timeout=60,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 下 NORMAL 只在 checkpoint 时 fsync，逐条提交不再是瓶颈
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS parses (
+                text_hash TEXT,
+                analyzer TEXT,
+                version TEXT,
+                payload BLOB,
+                size INTEGER,
+                last_access REAL,
+                PRIMARY KEY (text_hash, analyzer, version)
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_parses_last_access "
+            "ON parses(last_access)")
+        self._conn.commit()
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM parses").fetchone()[0]
+
+    @staticmethod
+    def _key(text: str, analyzer: str, version: str):
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        version_hash = hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]
+        return text_hash, analyzer, version_hash
+
+    def get(self, text: str, analyzer: str, version: str) -> Optional[str]:
+        key = self._key(text, analyzer, version)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM parses "
+                "WHERE text_hash=? AND analyzer=? AND version=?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE parses SET last_access=? "
+                "WHERE text_hash=? AND analyzer=? AND version=?",
+                (time.time(), *key))
+            self._conn.commit()
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, text: str, analyzer: str, version: str, serialized: str):
+        key = self._key(text, analyzer, version)
+        payload = zlib.compress(serialized.encode("utf-8"))
+        with self._lock:
+            # 覆盖已有条目时只计大小的差值，否则 _total 越记越大、频繁触发全表重算
+            old = self._conn.execute(
+                "SELECT size FROM parses "
+                "WHERE text_hash=? AND analyzer=? AND version=?", key
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parses VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, payload, len(payload), time.time()))
+            self._total += len(payload) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 先按真实大小重算（其他进程也可能在写），再淘汰到上限的 90%
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM parses").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        doomed = []
+        rows = self._conn.execute(
+            "SELECT text_hash, analyzer, version, size FROM parses "
+            "ORDER BY last_access")
+        for text_hash, analyzer, version, size in rows:
+            if self._total <= target:
+                break
+            doomed.append((text_hash, analyzer, version))
+            self._total -= size
+        self._conn.executemany(
+            "DELETE FROM parses "
+            "WHERE text_hash=? AND analyzer=? AND version=?", doomed)
+
+    def clear(self, analyzer: Optional[str] = None):
+        with self._lock:
+            if analyzer is None:
+                self._conn.execute("DELETE FROM parses")
+            else:
+                self._conn.execute("DELETE FROM parses WHERE analyzer=?",
+                                   (analyzer,))
+            self._conn.commit()
+            self._total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM parses").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+_DEFAULT_CACHE: Optional[ParseCache] = None
+
+
+def get_parse_cache() -> ParseCache:
+    """进程内共享的默认缓存（多进程时每个进程各自打开一次）。"""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = ParseCache()
+    return _DEFAULT_CACHE
+
+
+def reset_parse_cache():
+    """
+    子进程初始化时调用：丢掉 fork 时从父进程继承来的默认缓存（SQLite 连接不能跨 fork 使用），
+    下次 get_parse_cache() 会重新打开。继承来的连接不去 close，以免动到父进程的锁。
+    """
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = None
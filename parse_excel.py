@@ -12,10 +12,8 @@ PARSE_EXCEL ---
 # ------------------------ Code --------------------------------------
 
 import pandas as pd
-from tqdm import tqdm
-import time
 
-from API import LLM_trans
+from API import LLM_trans_many
 
 
 def run_translate2Chinese():
@@ -28,15 +26,12 @@ def run_translate2Chinese():
     temp_ls=text_list[:]
     print("Overall Length: ", len(temp_ls))
     translated_ls=[]
-    for jp_text in tqdm(temp_ls,desc="Translation Procedure:"):
-        try:
-            code_after_trans=LLM_trans(jp_text)
-        except Exception as e:
+    for code_after_trans in LLM_trans_many(temp_ls):
+        if isinstance(code_after_trans, Exception):
             print("A failed Sample Occured.")
             code_after_trans="Failed to Translate."
             
         translated_ls.append(code_after_trans)
-        time.sleep(0.3)
 
     assert len(temp_ls)==len(translated_ls)
     # Export to excel.
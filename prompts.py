@@ -245,3 +245,27 @@ TEXT_VV_V2_JAN="""あなたはプロの日本語言語学専門家です。今
 }
 ```
 """
+
+
+# 複数文を1リクエストにまとめる際に TEXT_VV_JAN / TEXT_VV_V2_JAN の後ろに付ける
+TEXT_BATCH_SUFFIX_JAN="""
+# 複数文の一括処理
+今回は、ユーザーが複数の文を次のようなJSON配列で一度に送ります：
+```py
+[{"id": str, "text": str}, ...]
+```
+各文を互いに独立に、上記の要件どおりに分析してください。出力は必ず以下のJSON形式とし、入力の各 "id" に対して結果を1つずつ、同じ "id" を付けて返してください。文を省略したり、まとめたりしないでください：
+```py
+{
+    "results": [
+        {"id": str, ...（上記の出力形式(B)の各項目）},
+        ...
+    ]
+}
+```
+"""
+
+# 批量模式用的完整 system prompt。TEXT_VV_JAN 的输出格式(B)代码块没有闭合，
+# 这里先补上再接后缀，免得批量说明落进代码块里；单句用的 TEXT_VV_JAN 本身不动
+TEXT_VV_BATCH_JAN=TEXT_VV_JAN+"```\n"+TEXT_BATCH_SUFFIX_JAN
+TEXT_VV_V2_BATCH_JAN=TEXT_VV_V2_JAN+TEXT_BATCH_SUFFIX_JAN
@@ -0,0 +1,85 @@
+"""
+======================================================================
+TEST_MECAB_WORKER ---
+
+MeCabWorker 与 mecab 子进程之间的管道读写。用一个逐行回显的假 mecab 代替真实程序，
+不需要安装 mecab。
+
+    python -m unittest test_mecab_worker
+
+    Author: Zi Liang <zi1415926.liang@connect.polyu.hk>
+    Copyright © 2025, ZiLiang, all rights reserved.
+    Created: 18 October 2026
+======================================================================
+"""
+
+
+# ------------------------ Code --------------------------------------
+
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from Mecab_Analysis import MeCabWorker
+
+# 每个输入行输出一行假的形态素和一个 EOS，输出量与输入同阶
+FAKE_MECAB = """\
+import sys
+for line in sys.stdin:
+    sys.stdout.write(line.rstrip("\\n") + "\\t名詞\\nEOS\\n")
+    sys.stdout.flush()
+"""
+
+
+class MeCabWorkerPipeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        script = Path(self._tmp.name) / "fake_mecab.py"
+        script.write_text(FAKE_MECAB, encoding="utf-8")
+        self.worker = MeCabWorker([sys.executable, str(script)])
+
+    def tearDown(self):
+        self.worker.close()
+        self._tmp.cleanup()
+
+    def _parse_with_timeout(self, text, timeout=20):
+        result = {}
+        thread = threading.Thread(
+            target=lambda: result.setdefault("out", self.worker.parse(text)),
+            daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            # 杀掉子进程让卡住的线程退出（parse 会重启一次再试，所以要杀到线程结束），
+            # tearDown 里的 close 才不会跟着卡住
+            while thread.is_alive():
+                if self.worker._proc is not None:
+                    self.worker._proc.kill()
+                thread.join(1)
+            self.fail("MeCabWorker.parse 卡死（stdin / stdout 管道互相等待）")
+        return result["out"]
+
+    def test_multi_megabyte_input(self):
+        # 约 6 MiB 的 UTF-8 输入，远超管道缓冲区
+        lines = [f"{'あ' * 100}{i}" for i in range(20000)]
+        out = self._parse_with_timeout("\n".join(lines))
+        self.assertEqual(out, [f"{line}\t名詞" for line in lines])
+
+    def test_single_long_line(self):
+        line = "い" * (1 << 20)
+        out = self._parse_with_timeout(line)
+        self.assertEqual(out, [f"{line}\t名詞"])
+
+    def test_worker_is_reused(self):
+        self.assertEqual(self._parse_with_timeout("本を読む"), ["本を読む\t名詞"])
+        proc = self.worker._proc
+        self.assertEqual(self._parse_with_timeout("壁\n押し込む"),
+                         ["壁\t名詞", "押し込む\t名詞"])
+        self.assertIs(self.worker._proc, proc)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,10 +11,16 @@ UTILS_CLS_PARSE ---
 
 # ------------------------ Code --------------------------------------
 
+import codecs
+import hashlib
+import json
+import os
+import pickle
+import sys
 from io import StringIO
 import pandas as pd   # 或 csv 标准库
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
 
 # 1. 暴力试码表（覆盖 99% 中日韩文本）
 _CJK_ENCODINGS: List[str] = [
@@ -29,9 +35,74 @@ _CJK_ENCODINGS: List[str] = [
     "iso2022-jp",            # 古老的 JIS（邮件里偶尔出现）
 ]
 
+# 2. BOM（UTF-32 的 BOM 以 UTF-16 的 BOM 开头，要先判断）
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+# 3. chardet 报告的编码 → 实际该用的超集（如 Windows 上的日文文件几乎都是 CP932）；
+#    键是 codecs.lookup(...).name 给出的规范名（下划线，如 euc_kr）
+_SUPERSET_ENCODINGS = {
+    "shift_jis": "cp932",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "euc_kr": "cp949",
+    "ascii": "utf-8",
+}
+
+# 编码检测只看文件开头这么多字节
+_SAMPLE_BYTES = 64 * 1024
+
+DEFAULT_ENCODING_SIDECAR = "./.cache/encodings.json"
+
+def _load_sidecar(sidecar: Path) -> dict:
+    try:
+        return json.loads(sidecar.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def _remember_encoding(sidecar: Path, key: str, stamp: list, encoding: str):
+    known = _load_sidecar(sidecar)
+    known[key] = [*stamp, encoding]
+    sidecar.parent.mkdir(parents=True, exist_ok=True)
+    tmp = sidecar.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_text(json.dumps(known, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, sidecar)
+
+def detect_encoding(sample: bytes, complete: bool = False) -> Optional[str]:
+    """
+    根据文件开头的一段字节猜测编码：BOM → 严格 UTF-8 → chardet（如果装了）。
+    complete=True 表示 sample 就是整个文件（末尾不会有被截断的多字节字符）。
+    都判断不出时返回 None。
+    """
+    for bom, enc in _BOMS:
+        if sample.startswith(bom):
+            return enc
+
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        import chardet
+    except ImportError:  # 没装 chardet 就跳过
+        return None
+    det = chardet.detect(sample)
+    if not det or not det["encoding"]:
+        return None
+    enc = codecs.lookup(det["encoding"]).name
+    return _SUPERSET_ENCODINGS.get(enc, enc)
+
 def read_cjk_text(path: str | Path,
                   encoding: Optional[str] = None,
-                  errors: str = "ignore") -> str:
+                  errors: str = "ignore",
+                  sidecar: str | Path | None = DEFAULT_ENCODING_SIDECAR) -> str:
     """
     自动识别 CJK 编码并读取文本文件。
 
@@ -40,14 +111,14 @@ def read_cjk_text(path: str | Path,
     path : 文件路径
     encoding : 如果显式给出，则直接采用；为 None 时自动检测
     errors : 解码失败时的处理方式，同 open() 的同名参数
+    sidecar : 记录 {文件路径: (mtime, 大小, 编码)} 的 JSON 文件，
+              文件未改动时直接复用上次检测到的编码；None 表示不记录
 
     返回
     ----
     str : 解码后的文本
 
-    异常
-    ----
-    最终仍无法解码时抛出 UnicodeDecodeError
+    文件只读取、解码一次；检测只用开头 _SAMPLE_BYTES 字节。
     """
     path = Path(path)
 
@@ -55,29 +126,34 @@ def read_cjk_text(path: str | Path,
     if encoding:
         return path.read_text(encoding=encoding, errors=errors)
 
-    # 2. 先试试 chardet（如果装了）
-    try:
-        import chardet
-        raw = path.read_bytes()
-        det = chardet.detect(raw)
-        print(det)
-        if det and det["encoding"]:
-            return raw.decode(det["encoding"], errors=errors)
-    except ImportError:  # 没装 chardet 就跳过
-        print("Using chardet failed.")
-        pass
-
-    # 3. 暴力试码表
-    for enc in _CJK_ENCODINGS:
+    raw = path.read_bytes()
+    st = path.stat()
+    key, stamp = str(path.resolve()), [st.st_mtime_ns, st.st_size]
+    sidecar = Path(sidecar) if sidecar is not None else None
+
+    # 2. 上次检测过且文件没变：直接解码
+    if sidecar is not None:
+        known = _load_sidecar(sidecar).get(key)
+        if known and known[:2] == stamp:
+            return raw.decode(known[2], errors=errors)
+
+    # 3. 抽样检测，再用检测结果严格解码整个文件
+    detected = detect_encoding(raw[:_SAMPLE_BYTES],
+                               complete=len(raw) <= _SAMPLE_BYTES)
+    candidates = [detected] if detected else []
+    # 4. 抽样之后的部分解码失败时，才在内存里逐个试码表
+    candidates += [enc for enc in _CJK_ENCODINGS if enc != detected]
+    for enc in candidates:
         try:
-            print(enc)
-            return path.read_text(encoding=enc, errors="strict")
+            text = raw.decode(enc, errors="strict")
         except UnicodeDecodeError:
-            print("Using CJK Encodings failed.")
             continue
+        if sidecar is not None:
+            _remember_encoding(sidecar, key, stamp, enc)
+        return text
 
-    # 4. 最后一搏：用 utf-8 带 ignore 保底
-    return path.read_text(encoding="utf-8", errors=errors)
+    # 5. 最后一搏：用检测结果（或 utf-8）带 errors 保底
+    return raw.decode(detected or "utf-8", errors=errors)
 
 def construct_a_dict(fname):
     stra=read_cjk_text(fname)
@@ -88,129 +164,472 @@ def construct_a_dict(fname):
         dtype=str,
     ).set_index(1)[2].to_dict()
 
+class LexiconEntry(NamedTuple):
+    """SAKUIN.txt 的一行：読み,見出し,分類番号,段落番号,小段落番号,..."""
+    reading: str
+    headword: str
+    code: str
+    paragraph: str
+    small_paragraph: str
+
+def _group_rows(keys: List[str]) -> Dict[str, int | Tuple[int, ...]]:
+    """{key: 行号}；同一 key 有多行时为行号元组（绝大多数 key 只有一行，存 int 更省）"""
+    groups: Dict[str, List[int]] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(key, []).append(i)
+    return {k: (v[0] if len(v) == 1 else tuple(v)) for k, v in groups.items()}
+
+class LexiconIndex:
+    """
+    SAKUIN.txt 的多值索引：同一见出し的所有义项都保留（construct_a_dict 只留最后一个）。
+
+    按列存放各字段（重复的分类番号等字符串经 intern 后只存一份），
+    见出し / 読み → 行号 的两个 dict 提供 O(1) 查找，LexiconEntry 在查询时才构造。
+    这样整个对象 pickle 后可以很快载入，见 load_lexicon_index。
+    """
+
+    def __init__(self, entries: List[LexiconEntry]):
+        columns = zip(*entries) if entries else [()] * len(LexiconEntry._fields)
+        self._columns = tuple([sys.intern(x) for x in col] for col in columns)
+        self._by_headword = _group_rows(self._columns[1])
+        self._by_reading = _group_rows(self._columns[0])
+
+    @property
+    def entries(self) -> List[LexiconEntry]:
+        return [LexiconEntry._make(row) for row in zip(*self._columns)]
+
+    def _rows(self, ids) -> Tuple[LexiconEntry, ...]:
+        if ids is None:
+            return ()
+        if isinstance(ids, int):
+            ids = (ids,)
+        return tuple(LexiconEntry._make([col[i] for col in self._columns])
+                     for i in ids)
+
+    def lookup(self, headword: str) -> Tuple[LexiconEntry, ...]:
+        """该见出し的全部义项，按文件顺序"""
+        return self._rows(self._by_headword.get(headword))
+
+    def lookup_reading(self, reading: str) -> Tuple[LexiconEntry, ...]:
+        """该読み的全部词条，按文件顺序"""
+        return self._rows(self._by_reading.get(reading))
+
+    def codes(self, headword: str) -> List[str]:
+        """该见出し的全部分类番号（去重，保持文件顺序）"""
+        return list(dict.fromkeys(e.code for e in self.lookup(headword)))
+
+    def to_frame(self) -> pd.DataFrame:
+        """全部词条的 DataFrame，列同 LexiconEntry，按文件顺序"""
+        return pd.DataFrame(dict(zip(LexiconEntry._fields, self._columns)))
+
+    def __contains__(self, headword: str) -> bool:
+        return headword in self._by_headword
+
+    def __len__(self) -> int:
+        return len(self._by_headword)
+
+def construct_lexicon_index(fname: str | Path) -> LexiconIndex:
+    """读取 SAKUIN.txt，构建保留全部义项的 LexiconIndex"""
+    stra = read_cjk_text(fname)
+    df = pd.read_csv(
+        StringIO(stra),
+        header=None,
+        dtype=str,
+        keep_default_na=False,  # 见出し里的 "NA" / "null" 之类不要变成 NaN
+    )
+    entries = [LexiconEntry(*row)
+               for row in df.iloc[:, :5].itertuples(index=False, name=None)]
+    return LexiconIndex(entries)
+
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+import bisect
 from pathlib import Path
 import re
 
-def construct_cls_map_dict(txt_path: str | Path) -> dict[str, list[str]]:
-    # 高层语义
-    L0_MAP = {'1': '体の類', '2': '用の類', '3': '相の類', '4': 'その他の類'}
-    
-    # L1 映射规则（简化版）
-    def get_l1(major: str, minor_num: int) -> str:
-        if major == '1':
-            if (100 <= minor_num <= 199) or (1100 <= minor_num <= 1999):
-                return '抽象的関係'
-            elif (200 <= minor_num <= 299) or (2300 <= minor_num <= 2399):
-                return '人間活動の主体'
-            elif (300 <= minor_num <= 399) or (3000 <= minor_num <= 3999):
-                return '人間活動－精神および行為'
-            elif 400 <= minor_num <= 499:
-                return '生産物および用具'
-            elif 500 <= minor_num <= 599:
-                return '自然物および自然現象'
-        elif major == '2':
-            if (100 <= minor_num <= 199) or (1500 <= minor_num <= 1999):
-                return '抽象的関係'
-            elif (300 <= minor_num <= 399) or (3000 <= minor_num <= 3999):
-                return '精神および行為'
-            elif 500 <= minor_num <= 599:
-                return '自然現象'
-        elif major == '3':
-            if 100 <= minor_num <= 199:
-                return '抽象的関係'
-            elif 300 <= minor_num <= 399:
-                return '精神および行為'
-            elif 500 <= minor_num <= 599:
-                return '自然現象'
-        return ''
-
-    txt = read_cjk_text(txt_path)
-    
-    # 两种正则：
-    # 1. 带点的绝对/相对编号
-    pattern1 = re.compile(r'^(?P<prefix>\s*)(?P<code>(?:\d+\.\d+(?:\.\d+)*|\.\d+))[ \u3000]+(?P<term>[^ \u3000].*?)(?=[ \u3000]*$|\.+$)')
-    # 2. 纯数字子编号（必须有前导空白）
-    pattern2 = re.compile(r'^(?P<prefix>\s+)(?P<code>\d+)[ \u3000]+(?P<term>[^ \u3000].*?)(?=[ \u3000]*$)')
-
-    stack: list[tuple[str, int]] = []  # (full_code, indent_len)
-    code_to_term: dict[str, str] = {}
+# KOUMOKU.txt 的几种行：
+#   "1.     体の類"                  类（L0）
+#   "・・・ 1.1  抽象的関係 ・・・"   部門（L1），也可能不带 ・・・，如 "1.2    人間活動の主体"
+#   "1.1240 存在" / "2.14   力"        分类项目 / 中项目（绝对编号）
+#   " .101  事柄"                     相对编号：与上一个绝对编号同类，等价于 1.101
+#   "     1 内在"                     子项：替换上一个编号的最后一位，等价于 1.1241
+_CLASS_LINE = re.compile(r'^(?P<code>\d)\.?[ \u3000]+(?P<term>[^ \u3000\d.].*)$')
+_ABS_LINE = re.compile(r'^[・ \u3000]*(?P<code>\d\.\d+)[ \u3000]+(?P<term>[^ \u3000].*)$')
+_REL_LINE = re.compile(r'^\s*\.(?P<minor>\d+)[ \u3000]+(?P<term>[^ \u3000].*)$')
+_SUB_LINE = re.compile(r'^\s+(?P<digit>\d)[ \u3000]+(?P<term>[^ \u3000].*)$')
+
+def _clean_term(term: str) -> str:
+    return term.strip(" \u3000・").rstrip(".")
+
+def _parent_by_prefix(code: str, known: dict) -> str:
+    """编号的父节点：去掉小数部分末位后最长的已知编号（1.1560 → 1.15 → 1.1），都没有时为类本身"""
+    major, minor = code.split(".")
+    for k in range(len(minor) - 1, 0, -1):
+        candidate = f"{major}.{minor[:k]}"
+        if candidate in known:
+            return candidate
+    return major
+
+def parse_koumoku_nodes(txt: str) -> List[Tuple[str, str, str]]:
+    """KOUMOKU.txt 全文 → [(编号, 见出し, 父编号), ...]，按文件顺序；根节点的编号为 ""。"""
+    nodes: List[Tuple[str, str, str]] = []
+    known: Dict[str, str] = {}   # 编号 → 父编号
+    heading: Optional[str] = None  # 子项所依附的最近一个编号
+
+    def add(code, term, parent):
+        if code in known:  # 如 "1.120 有無" 下的 "0 出現" 会与标题本身重号
+            return
+        known[code] = parent
+        nodes.append((code, _clean_term(term), parent))
 
     for line in txt.splitlines():
-        clean_line = line.rstrip()
-        if not clean_line:
+        line = line.rstrip()
+        if not line:
             continue
+        if m := _CLASS_LINE.match(line):
+            add(m["code"], m["term"], "")
+            heading = None
+        elif m := _ABS_LINE.match(line):
+            code = m["code"]
+            add(code, m["term"], _parent_by_prefix(code, known))
+            heading = code
+        elif heading and (m := _REL_LINE.match(line)):
+            code = f"{heading.split('.')[0]}.{m['minor']}"
+            add(code, m["term"], _parent_by_prefix(code, known))
+            heading = code
+        elif heading and (m := _SUB_LINE.match(line)):
+            add(heading[:-1] + m["digit"], m["term"], heading)
+    return nodes
+
+class CategoryTree:
+    """
+    分類語彙表（KOUMOKU.txt）的类别树。
+
+    节点 id 为先序遍历序号，因此任一节点的子树恰好是 id 区间 [i, end[i])：
+    - ancestors(code)：每个节点预先存好祖先 id 元组（树深不超过 5），O(1)；
+    - is_ancestor(a, b)：区间包含判断，O(1)；
+    - descendants(code)：先序数组切片，O(子树大小)。
+    depth 1 为类（L0，体の類…），depth 2 为部門（L1，抽象的関係…）。
+    section(code) 用按编号排序的部門区间表二分查找，KOUMOKU 中没有的编号也能定位到 L1。
+    """
 
-        m1 = pattern1.search(clean_line)
-        m2 = None
-        full_code = None
-        term = None
-        indent_len = 0
-
-        if m1:
-            prefix = m1['prefix']
-            indent_len = len(prefix)
-            code_str = m1['code']
-            term = m1['term'].strip()
-            # 处理相对编号
-            if code_str.startswith('.'):
-                if stack:
-                    parent_code, _ = stack[-1]
-                    full_code = parent_code + code_str
-                else:
-                    continue
-            else:
-                full_code = code_str
-        else:
-            m2 = pattern2.search(clean_line)
-            if m2:
-                prefix = m2['prefix']
-                indent_len = len(prefix)
-                code_str = m2['code']
-                term = m2['term'].strip()
-                # 视为相对编号 .{code_str}
-                if stack:
-                    parent_code, parent_indent = stack[-1]
-                    if indent_len > parent_indent:  # 确保是子项
-                        full_code = parent_code + '.' + code_str
-                    else:
-                        continue
-                else:
-                    continue
-            else:
-                continue
-
-        # 更新 stack
-        # 找到父级位置
-        while stack and stack[-1][1] >= indent_len:
-            stack.pop()
-        stack.append((full_code, indent_len))
-        code_to_term[full_code] = term
-
-    # 构建最终结果
-    result = {}
-    for full_code, term in code_to_term.items():
-        parts = full_code.split('.')
-        major = parts[0]
-        l0 = L0_MAP.get(major, '')
-        l1 = ''
-
-        # 确定 L1：找第二段（如果是 1.4150，则第二段是 4150）
-        if len(parts) >= 2:
-            try:
-                minor_num = int(parts[1])
-                l1 = get_l1(major, minor_num)
-            except:
-                pass
-
-        result[full_code] = [l0, l1, term]
-
-    return result
+    ROOT = ""
+
+    def __init__(self, nodes: List[Tuple[str, str, str]]):
+        children: Dict[str, List[str]] = {}
+        terms = {self.ROOT: "分類語彙表"}
+        for code, term, parent in nodes:
+            children.setdefault(parent, []).append(code)
+            terms[code] = term
+
+        self.codes: List[str] = []
+        self.terms: List[str] = []
+        self.parent: List[int] = []
+        self.depth: List[int] = []
+        self.end: List[int] = []
+        self.ancestor_ids: List[Tuple[int, ...]] = []
+        self.by_code: Dict[str, int] = {}
+
+        # 先序遍历分配 id；end[i] 在整棵子树访问完之后回填
+        stack = [(self.ROOT, -1, ())]
+        while stack:
+            code, parent_id, ancestors = stack.pop()
+            node_id = len(self.codes)
+            self.by_code[code] = node_id
+            self.codes.append(code)
+            self.terms.append(terms[code])
+            self.parent.append(parent_id)
+            self.depth.append(len(ancestors))
+            self.ancestor_ids.append(ancestors)
+            self.end.append(node_id + 1)
+            for child in reversed(children.get(code, [])):
+                stack.append((child, node_id, ancestors + (node_id,)))
+        for node_id in range(len(self.codes) - 1, -1, -1):
+            parent_id = self.parent[node_id]
+            if parent_id >= 0:
+                self.end[parent_id] = max(self.end[parent_id], self.end[node_id])
+
+        # 部門区间表：按编号排序，编号 c 覆盖所有以 c 开头的编号
+        sections = sorted((c, i) for c, i in self.by_code.items()
+                          if self.depth[i] == 2)
+        self._section_starts = [c for c, _ in sections]
+        self._section_ids = [i for _, i in sections]
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.by_code
+
+    def __len__(self) -> int:
+        return len(self.codes) - 1  # 不计根节点
+
+    def term(self, code: str) -> str:
+        return self.terms[self.by_code[code]]
+
+    def ancestors(self, code: str) -> List[str]:
+        """从类（depth 1）到父节点的编号列表"""
+        return [self.codes[i] for i in self.ancestor_ids[self.by_code[code]][1:]]
+
+    def is_ancestor(self, ancestor: str, code: str) -> bool:
+        a, i = self.by_code[ancestor], self.by_code[code]
+        return a < i < self.end[a]
+
+    def descendants(self, code: str) -> List[str]:
+        """子树中的全部编号（不含自身），先序"""
+        i = self.by_code[code]
+        return self.codes[i + 1:self.end[i]]
+
+    def level(self, code: str, depth: int) -> Optional[str]:
+        """code 在指定深度上的祖先（或自身）；1 = 类，2 = 部門"""
+        i = self.by_code[code]
+        if self.depth[i] == depth:
+            return code
+        chain = self.ancestor_ids[i]
+        return self.codes[chain[depth]] if depth < len(chain) else None
+
+    def section(self, code: str) -> Optional[str]:
+        """任意编号所属的部門（L1）编号，编号不必出现在 KOUMOKU 中；找不到时为 None"""
+        k = bisect.bisect_right(self._section_starts, code) - 1
+        if k >= 0 and code.startswith(self._section_starts[k]):
+            return self._section_starts[k]
+        return None
+
+    def to_cls_map(self) -> dict[str, list[str]]:
+        """{编号: [L0, L1, 见出し]}，与 construct_cls_map_dict 的返回格式相同"""
+        result = {}
+        for i in range(1, len(self.codes)):
+            chain = self.ancestor_ids[i] + (i,)
+            l0 = self.terms[chain[1]]
+            l1 = self.terms[chain[2]] if len(chain) > 2 else ''
+            result[self.codes[i]] = [l0, l1, self.terms[i]]
+        return result
+
+def construct_category_tree(txt_path: str | Path) -> CategoryTree:
+    return CategoryTree(parse_koumoku_nodes(read_cjk_text(txt_path)))
+
+def construct_cls_map_dict(txt_path: str | Path) -> dict[str, list[str]]:
+    """{编号: [L0, L1, 见出し]}；L1 取自文件中的部門标题（旧版 get_l1 的硬编码区间只覆盖了一部分）"""
+    return construct_category_tree(txt_path).to_cls_map()
 # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 
+# ------------------- 见出し的表记揺れ回退 -------------------
+from collections import Counter
+import itertools
+
+# 片假名 → 平假名，历史假名ゐ/ゑ → い/え
+_KANA_FOLD = str.maketrans({
+    **{chr(c): chr(c - 0x60) for c in range(ord("ァ"), ord("ヶ") + 1)},
+    "ヰ": "い", "ヱ": "え", "ゐ": "い", "ゑ": "え",
+})
+
+def fold_kana(word: str) -> str:
+    return word.translate(_KANA_FOLD)
+
+def _is_kana(ch: str) -> bool:
+    return "ぁ" <= ch <= "ゟ" or "゠" <= ch <= "ヿ"
+
+def _kana_runs(word: str) -> List[Tuple[bool, str]]:
+    """把词切成交替的 (是否假名, 片段)，如 引き摺る → 引 / き / 摺 / る"""
+    return [(k, "".join(g)) for k, g in itertools.groupby(word, key=_is_kana)]
+
+def okurigana_key(word: str) -> Optional[str]:
+    """去掉夹在两段汉字之间的送り仮名：引き摺る / 引摺る → 引摺る；不含汉字时为 None"""
+    runs = _kana_runs(fold_kana(word))
+    if all(k for k, _ in runs):
+        return None
+    last = len(runs) - 1
+    return "".join(t for i, (k, t) in enumerate(runs) if not (k and 0 < i < last))
+
+def learn_kanji_readings(lexicon: LexiconIndex,
+                         top: int = 4) -> Dict[str, Tuple[Tuple[str, int], ...]]:
+    """
+    把 SAKUIN 中汉字假名混写的见出し与読み对齐（假名段当锚点），
+    学出每段汉字的读法：{汉字段: ((读法, 次数), ...)}，按次数降序，最多 top 个。
+    如 思い直す/おもいなおす → 思: おも，直: なお。
+    """
+    counts: Dict[str, Counter] = {}
+    for reading, headword in zip(lexicon._columns[0], lexicon._columns[1]):
+        runs = _kana_runs(fold_kana(headword))
+        if all(k for k, _ in runs):
+            continue
+        pattern = "".join(re.escape(t) if k else "(.+?)" for k, t in runs)
+        m = re.fullmatch(pattern, fold_kana(reading))
+        if m is None:
+            continue
+        for text, r in zip((t for k, t in runs if not k), m.groups()):
+            counts.setdefault(text, Counter())[r] += 1
+    return {text: tuple(c.most_common(top)) for text, c in counts.items()}
+
+class NormalizationIndex:
+    """
+    SAKUIN 中查不到的词按层回退，每层都是预先算好的 dict，单次查找与词表大小无关：
+
+    exact      见出し原样
+    kana       假名归一（片假名/ゐゑ）后的见出し；纯假名词再按読み查
+    okurigana  去掉中间送り仮名后的键（引き摺る ↔ 引摺る）
+    reading    用 learn_kanji_readings 学到的汉字读法拼出読み（回る → まわる），
+               候选按读法出现次数排序，最多试 max_readings 个
+
+    tier_counts 记录各层命中次数（未命中记为 ""），见 report()。
+    """
+
+    TIERS = ("exact", "kana", "okurigana", "reading")
+
+    def __init__(self, lexicon: LexiconIndex, max_readings: int = 32):
+        self.lexicon = lexicon
+        self.max_readings = max_readings
+        self.readings = learn_kanji_readings(lexicon)
+        self._by_okurigana = _group_rows(
+            [okurigana_key(h) or "" for h in lexicon._columns[1]])
+        self._by_okurigana.pop("", None)
+        self.tier_counts: Counter = Counter()
+
+    def _reading_candidates(self, folded: str) -> List[str]:
+        options = []
+        for is_kana, text in _kana_runs(folded):
+            if is_kana:
+                options.append(((text, 1),))
+            elif text in self.readings:
+                options.append(self.readings[text])
+            elif all(c in self.readings for c in text):
+                # 整段没见过时逐字拼
+                options.append(tuple(
+                    ("".join(r for r, _ in combo), min(n for _, n in combo))
+                    for combo in itertools.product(*(self.readings[c] for c in text))))
+            else:
+                return []
+        scored = []
+        for combo in itertools.islice(itertools.product(*options), self.max_readings):
+            score = 1
+            for _, n in combo:
+                score *= n
+            scored.append((-score, "".join(r for r, _ in combo)))
+        return [r for _, r in sorted(scored)]
+
+    def _probe(self, word: str):
+        yield "exact", self.lexicon.lookup(word)
+        folded = fold_kana(word)
+        if folded != word:
+            yield "kana", self.lexicon.lookup(folded)
+        if all(map(_is_kana, folded)):
+            yield "kana", self.lexicon.lookup_reading(folded)
+            return
+        yield "okurigana", self.lexicon._rows(self._by_okurigana.get(okurigana_key(word)))
+        for reading in self._reading_candidates(folded):
+            yield "reading", self.lexicon.lookup_reading(reading)
+
+    def resolve(self, word: str,
+                classes: Optional[Tuple[str, ...]] = None) -> Tuple[str, Tuple[LexiconEntry, ...]]:
+        """
+        返回 (命中的层, 义项)；都查不到时为 ("", ())。
+        classes 为分类番号前缀（如动词用 ("2.",)），只约束 exact 以外的回退层。
+        """
+        for tier, entries in self._probe(word):
+            if classes is not None and tier != "exact":
+                entries = tuple(e for e in entries if e.code.startswith(classes))
+            if entries:
+                self.tier_counts[tier] += 1
+                return tier, entries
+        self.tier_counts[""] += 1
+        return "", ()
+
+    def report(self) -> str:
+        """各层命中率，如 "exact 216 (64.3%), kana 0 (0.0%), ..., miss 20 (6.0%)" """
+        total = sum(self.tier_counts.values()) or 1
+        return ", ".join(f"{tier or 'miss'} {self.tier_counts[tier]} "
+                         f"({self.tier_counts[tier] / total:.1%})"
+                         for tier in self.TIERS + ("",))
+
+def construct_normalization_index(fname: str | Path) -> NormalizationIndex:
+    return NormalizationIndex(construct_lexicon_index(fname))
+
+
+# ------------------- 预编译的二进制缓存 -------------------
+DEFAULT_COMPILED_DIR = "./.cache/bunrui"
+# 解析逻辑或 LexiconIndex / CategoryTree 的内部结构改动时加一，旧缓存随之作废
+_COMPILED_FORMAT = 2
+
+T = TypeVar("T")
+
+def _file_checksum(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def load_compiled(src_path: str | Path,
+                  build: Callable[[Path], T],
+                  cache_dir: str | Path = DEFAULT_COMPILED_DIR,
+                  force: bool = False) -> T:
+    """
+    读取 build(src_path) 的预编译结果。
+
+    缓存文件依次 pickle 了 (格式版本, 源文件 sha256) 和数据本身；
+    源文件内容或格式版本变化（或 force=True）时重新 build 并原子地写回。
+    以脚本方式运行时 build 出的对象属于 __main__，pickle 后别的入口解不开，这种结果不写缓存。
+    """
+    src_path = Path(src_path)
+    checksum = _file_checksum(src_path)
+    target = Path(cache_dir) / f"{src_path.name}.{build.__name__}.pkl"
+
+    if not force:
+        try:
+            with open(target, "rb") as f:
+                if pickle.load(f) == (_COMPILED_FORMAT, checksum):
+                    return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass  # 没有缓存 / 缓存损坏
+        except (AttributeError, ImportError) as e:
+            # 缓存里引用的类找不到：多半是以脚本方式写出的 __main__.* 或类已改名
+            print(f"Compiled cache {target} references missing classes ({e}); rebuilding.",
+                  file=sys.stderr)
+
+    data = build(src_path)
+    if type(data).__module__ == "__main__":
+        print(f"Not caching {target}: {type(data).__qualname__} is defined in __main__.",
+              file=sys.stderr)
+        return data
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp, "wb") as f:
+        pickle.dump((_COMPILED_FORMAT, checksum), f)
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, target)
+    return data
+
+def load_lexicon_index(fname: str | Path = "./data_cls/SAKUIN.txt",
+                       cache_dir: str | Path = DEFAULT_COMPILED_DIR) -> LexiconIndex:
+    """construct_lexicon_index 的缓存版本，SAKUIN.txt 改动后自动重建"""
+    return load_compiled(fname, construct_lexicon_index, cache_dir)
+
+def load_cls_map_dict(txt_path: str | Path = "./data_cls/KOUMOKU.txt",
+                      cache_dir: str | Path = DEFAULT_COMPILED_DIR) -> dict[str, list[str]]:
+    """construct_cls_map_dict 的缓存版本，KOUMOKU.txt 改动后自动重建"""
+    return load_compiled(txt_path, construct_cls_map_dict, cache_dir)
+
+def load_category_tree(txt_path: str | Path = "./data_cls/KOUMOKU.txt",
+                       cache_dir: str | Path = DEFAULT_COMPILED_DIR) -> CategoryTree:
+    """construct_category_tree 的缓存版本，KOUMOKU.txt 改动后自动重建"""
+    return load_compiled(txt_path, construct_category_tree, cache_dir)
+
+def load_normalization_index(fname: str | Path = "./data_cls/SAKUIN.txt",
+                             cache_dir: str | Path = DEFAULT_COMPILED_DIR) -> NormalizationIndex:
+    """construct_normalization_index 的缓存版本，SAKUIN.txt 改动后自动重建"""
+    return load_compiled(fname, construct_normalization_index, cache_dir)
+
+def compile_dictionaries(sakuin: str | Path = "./data_cls/SAKUIN.txt",
+                         koumoku: str | Path = "./data_cls/KOUMOKU.txt",
+                         cache_dir: str | Path = DEFAULT_COMPILED_DIR):
+    """构建步骤：强制重新编译两个词表（python utils_cls_parse.py build）"""
+    load_compiled(sakuin, construct_lexicon_index, cache_dir, force=True)
+    load_compiled(sakuin, construct_normalization_index, cache_dir, force=True)
+    load_compiled(koumoku, construct_cls_map_dict, cache_dir, force=True)
+    load_compiled(koumoku, construct_category_tree, cache_dir, force=True)
+
+
 if __name__=="__main__":
+    if sys.argv[1:] == ["build"]:
+        # 经由真正的模块构建，pickle 里的类才是 utils_cls_parse.* 而不是 __main__.*
+        import utils_cls_parse
+        utils_cls_parse.compile_dictionaries()
+        sys.exit(0)
+
     d = construct_cls_map_dict('./data_cls/KOUMOKU.txt')
     from pprint import pprint
     pprint(d)